@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+실시간 종목 질문 분류 HTTP 서버
+- 분류 모델(model-update), 검증용 tokenizer, 종목 매처를 시작 시 한 번만 로드
+- POST /classify 로 단일({"text": ...}) 또는 배치({"texts": [...]}) 분류
+- 동시에 들어온 요청은 max_wait_ms 동안 모아 한 번에 추론 (micro-batching)
+- GET /metrics 로 처리 시간 p50/p99 확인
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src import EnvManager, ModelManager, QueryFeatureExtractor
+from src.service import ClassificationService, create_server
+import argparse
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("classify_server.log"),
+        logging.StreamHandler()
+    ]
+)
+
+def build_service(args):
+    """predictor와 종목 매처를 로드해 분류 서비스를 생성"""
+    env_manager = EnvManager(args)
+    model_manager = ModelManager(env_manager.model_config)
+    model_path = env_manager.model_config['model_path']
+    predictor = model_manager.initialize_predictor(os.path.join(model_path, 'kfdeberta', 'model-update'))
+    val_tokenizer = model_manager.set_val_tokenizer(os.path.join(model_path, 'val-tokenizer'))
+    query_features = QueryFeatureExtractor(env_manager.tickle_matcher, val_tokenizer)
+    return ClassificationService(predictor, query_features,
+                                 max_batch_size=args.max_batch_size or env_manager.model_config.get('batch_size', 32),
+                                 max_wait_ms=args.max_wait_ms)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='실시간 종목 질문 분류 HTTP 서버')
+    parser.add_argument('--config_path', type=str, default='./config/')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max_batch_size', type=int, default=None, help='한 번에 추론할 최대 문장 수 (기본값: model_config batch_size)')
+    parser.add_argument('--max_wait_ms', type=float, default=5, help='배치를 모으기 위해 기다리는 최대 시간 (ms)')
+    args = parser.parse_args()
+
+    logger = logging.getLogger(__name__)
+    server = create_server(build_service(args), host=args.host, port=args.port)
+    logger.info(f"🚀 분류 서버 시작: http://{args.host}:{args.port}/classify")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("⏹️ 분류 서버가 중단되었습니다")
+    finally:
+        server.server_close()
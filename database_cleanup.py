@@ -13,9 +13,9 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src import EnvManager, DBManager
+from src.preprocessor import DataProcessor
 import argparse
 import logging
-import hashlib
 import pandas as pd
 import re
 from datetime import datetime
@@ -29,12 +29,6 @@ logging.basicConfig(
     ]
 )
 
-def generate_hash_value(user_id, content, date):
-    """해시값 생성"""
-    return hashlib.md5(
-        f"{user_id}_{content}_{date}".encode()
-    ).hexdigest()
-
 def is_valid_conv_id(conv_id):
     """정상적인 conv_id 형식인지 확인 (YYYYMMDD_XXXXX)"""
     pattern = re.compile(r'^\d{8}_\d{5}$')
@@ -199,11 +193,11 @@ def cleanup_database(execute=False):
         updated_count = 0
         skipped_count = 0
         
-        for record in tqdm(null_hash_records, desc="해시값 업데이트"):
-            conv_id, user_id, content, date = record
-            
-            # 기본 해시값 생성
-            hash_value = generate_hash_value(user_id, content, date)
+        # 기본 해시값 일괄 생성 (generate_hash_value와 동일한 방식)
+        conv_ids, user_ids, contents, dates = zip(*null_hash_records)
+        hash_values = DataProcessor().hash_values(user_ids, contents, dates, n_workers=os.cpu_count() or 1)
+        
+        for conv_id, hash_value in tqdm(zip(conv_ids, hash_values), total=len(conv_ids), desc="해시값 업데이트"):
             
             # 중복 체크
             if hash_value in existing_hashes:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+대화 로그 테이블 스키마 마이그레이션 스크립트
+- get_day_data, 중복 해시 조회용 인덱스 생성 (conv_id C collation, hash_value, date, tenant_id)
+- (선택) conv_id 접두사 기준 월별 네이티브 파티션 전환
+- (선택) 다가오는 월 파티션 미리 생성
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src import EnvManager, DBManager, SchemaMigrator
+import argparse
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("database_migration.log"),
+        logging.StreamHandler()
+    ]
+)
+
+def migrate_database(partition=False, ensure_partitions=False, months_ahead=3, drop_legacy=False):
+    """인덱스 생성 및 파티션 전환 작업"""
+    logger = logging.getLogger(__name__)
+
+    # 환경 설정
+    args = argparse.Namespace()
+    args.config_path = './config/'
+    env_manager = EnvManager(args)
+    db_manager = DBManager(env_manager.db_config)
+
+    # 데이터베이스 연결
+    postgres, table_editor = db_manager.initialize_database()
+    migrator = SchemaMigrator(postgres.db_connection)
+    table_name = env_manager.conv_tb_name
+
+    try:
+        if partition:
+            logger.info(f"🔄 {table_name} 월별 파티션 전환 중...")
+            partitions = migrator.partition_by_month(table_name, months_ahead=months_ahead, drop_legacy=drop_legacy)
+            if partitions:
+                logger.info(f"✅ 파티션 전환 완료: {partitions[0]} ~ {partitions[-1]} ({len(partitions)}개)")
+                if not drop_legacy:
+                    logger.info(f"   기존 테이블은 {table_name}_legacy 로 보관됩니다")
+            else:
+                logger.info("⏭️ 이미 파티션 테이블입니다")
+        elif ensure_partitions:
+            if migrator.is_partitioned(table_name):
+                partitions = migrator.ensure_month_partitions(table_name, months_ahead=months_ahead)
+                logger.info(f"✅ 월별 파티션 확인 완료: {partitions[0]} ~ {partitions[-1]}")
+            else:
+                logger.warning(f"⚠️ {table_name}은(는) 파티션 테이블이 아닙니다. --partition 으로 먼저 전환하세요")
+
+        logger.info(f"🔍 {table_name} 인덱스 생성 중...")
+        unique_hash = migrator.create_indexes(table_name)
+        if unique_hash:
+            logger.info("✅ 인덱스 생성 완료 (hash_value UNIQUE)")
+        else:
+            logger.warning("⚠️ hash_value는 일반 인덱스로 생성되었습니다 (파티션 테이블 또는 기존 중복 해시 존재)")
+            if not migrator.is_partitioned(table_name):   # 파티션 테이블은 저장 시 잠금 후 기존 해시를 조회해 중복 제외
+                logger.warning("   기존 중복 해시를 database_cleanup.py로 정리하기 전까지 데이터 수집 저장이 실행되지 않습니다")
+    finally:
+        postgres.db_connection.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='대화 로그 테이블 스키마 마이그레이션 스크립트')
+    parser.add_argument('--indexes', action='store_true',
+                       help='인덱스만 생성')
+    parser.add_argument('--partition', action='store_true',
+                       help='월별 파티션 테이블로 전환 후 인덱스 생성')
+    parser.add_argument('--ensure_partitions', action='store_true',
+                       help='현재 월 + months_ahead 까지 파티션 미리 생성 (월 1회 실행 권장)')
+    parser.add_argument('--months_ahead', type=int, default=3)
+    parser.add_argument('--drop_legacy', action='store_true',
+                       help='파티션 전환 후 기존 테이블 삭제')
+
+    args = parser.parse_args()
+
+    if args.indexes or args.partition or args.ensure_partitions:
+        migrate_database(
+            partition=args.partition,
+            ensure_partitions=args.ensure_partitions,
+            months_ahead=args.months_ahead,
+            drop_legacy=args.drop_legacy
+        )
+    else:
+        print("📋 대화 로그 테이블 스키마 마이그레이션 스크립트")
+        print("=" * 50)
+        print("사용법:")
+        print("  python database_migration.py --indexes             # 인덱스 생성")
+        print("  python database_migration.py --partition           # 월별 파티션 전환 + 인덱스 생성")
+        print("  python database_migration.py --ensure_partitions   # 다가오는 월 파티션 생성")
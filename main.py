@@ -1,4 +1,4 @@
-from src import EnvManager, PreProcessor, DBManager, ModelManager, LLMManager, PipelineController 
+from src import EnvManager, PreProcessor, DBManager, ModelManager, LLMManager, PipelineController, ClassificationWorker, ShardedReclassifier
 from apscheduler.schedulers.blocking import BlockingScheduler
 from scheduler_config import get_schedule_config
 import argparse
@@ -16,8 +16,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def main(args):
+    pipe = None
     try:
         logger.info("=== Main Pipeline 시작 ===")
+        if args.process == 'reprocess':
+            # 과거 데이터 재분류: 날짜 범위 shard를 여러 프로세스에서 동시에 처리
+            reclassifier = ShardedReclassifier(args, n_workers=args.workers, relabel=args.relabel)
+            reclassifier.run(start_date=args.start_date, end_date=args.end_date)
+            logger.info("=== Main Pipeline 완료 ===")
+            return
         env_manager = EnvManager(args)
         preprocessor = PreProcessor()
         db_manager = DBManager(env_manager.db_config)
@@ -31,33 +38,53 @@ def main(args):
     except Exception as e:
         logger.error(f"Main Pipeline 실행 중 오류 발생: {str(e)}")
         raise
+    finally:
+        if pipe is not None:
+            pipe.release_connection()   # 풀 커넥션 반납
 
-def run_scheduled():
-    """스케줄된 작업 실행"""
+def parse_scheduled_args():
     cli_parser = argparse.ArgumentParser()
     cli_parser.add_argument('--config_path', type=str, default='./config/')
     cli_parser.add_argument('--process', type=str, default='code-test')  # 전체 데이터 저장 프로세스
     cli_parser.add_argument('--task_name', type=str, default='cls')
     cli_parser.add_argument('--query', type=str, default=None)
-    cli_args = cli_parser.parse_args()
-    main(cli_args)
+    return cli_parser.parse_args()
+
+resident_worker = None
+
+def run_scheduled(args):
+    """스케줄된 작업 실행 (상주 작업자의 모델을 재사용, 작업자 생성에 실패하면 다음 실행에서 다시 시도)"""
+    global resident_worker
+    try:
+        logger.info("=== Main Pipeline 시작 ===")
+        if resident_worker is None:
+            resident_worker = ClassificationWorker(args)
+        resident_worker.run_once()
+        logger.info("=== Main Pipeline 완료 ===")
+    except Exception as e:
+        logger.error(f"Main Pipeline 실행 중 오류 발생: {str(e)}")
 
 if __name__ == '__main__':
     if len(sys.argv) > 1 and sys.argv[1] == '--once':
         # 한 번만 실행
         cli_parser = argparse.ArgumentParser()
         cli_parser.add_argument('--config_path', type=str, default='./config/')
-        cli_parser.add_argument('--process', type=str, default='daily')
+        cli_parser.add_argument('--process', type=str, default='daily')   # daily, code-test, reprocess
         cli_parser.add_argument('--task_name', type=str, default='cls')
         cli_parser.add_argument('--query', type=str, default=None)
+        cli_parser.add_argument('--workers', type=int, default=None, help='reprocess 작업 프로세스 수 (기본값: CPU 코어 수)')
+        cli_parser.add_argument('--relabel', action='store_true', help='reprocess 시 이미 분류된 질문도 다시 분류')
+        cli_parser.add_argument('--start_date', type=str, default=None, help='reprocess 시작 날짜 (20240130 형식)')
+        cli_parser.add_argument('--end_date', type=str, default=None, help='reprocess 끝 날짜 (20240130 형식)')
         cli_args = cli_parser.parse_args()
         main(cli_args)
     else:
-        # 스케줄러로 매 시간 실행
+        # 스케줄러로 매 시간 실행: 모델은 첫 실행에서 한 번만 로드하고, 가중치가 바뀐 경우에만 다시 로드
         scheduler = BlockingScheduler()
         schedule_config = get_schedule_config('hourly_6min')    
         scheduler.add_job(
             run_scheduled,
+            args=[parse_scheduled_args()],
             trigger=schedule_config['trigger'],
             id='main_pipeline_hourly',
             name=f"Main Pipeline {schedule_config['description']}",
@@ -16,19 +16,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def run_scheduled():
-    """스케줄된 작업 실행"""
-    cli_parser = argparse.ArgumentParser()
-    cli_parser.add_argument('--config_path', type=str, default='./config/')
-    cli_parser.add_argument('--data_path', type=str, default='./data/')
-    cli_parser.add_argument('--file_name', type=str, default='conv_log-0705-0902.xlsx')
-    cli_parser.add_argument('--process', type=str, default='scheduled')
-    cli_parser.add_argument('--task_name', type=str, default='cls')
-    cli_parser.add_argument('--query', type=str, default=None)
-    cli_args = cli_parser.parse_args()
-    
-    pipeline = UnifiedPipeline(cli_args)
-    pipeline.run_full_pipeline()
+resident_pipeline = None
+
+def run_scheduled(args):
+    """스케줄된 작업 실행 (상주 파이프라인의 모델을 재사용, 가중치가 바뀐 경우에만 다시 로드)
+    파이프라인은 첫 실행에서 생성하며, DB나 모델 로드에 실패하면 다음 실행에서 다시 시도합니다."""
+    global resident_pipeline
+    try:
+        if resident_pipeline is None:
+            resident_pipeline = UnifiedPipeline(args)
+        with resident_pipeline.pipe.unit_of_work():   # 트리거마다 풀에서 커넥션을 받아 반납
+            resident_pipeline.refresh()
+            resident_pipeline.run_full_pipeline()
+    except Exception as e:
+        logger.error(f"❌ 파이프라인 실행 중 오류 발생: {str(e)}")
 
 if __name__ == '__main__':
     # 공통 argument parser 설정
@@ -39,6 +40,8 @@ if __name__ == '__main__':
     cli_parser.add_argument('--process', type=str, default='scheduled')
     cli_parser.add_argument('--task_name', type=str, default='cls')
     cli_parser.add_argument('--query', type=str, default=None)
+    cli_parser.add_argument('--stream', action='store_true', help='API 응답을 chunk 단위로 스트리밍 처리')
+    cli_parser.add_argument('--chunk_size', type=int, default=1000)
     cli_parser.add_argument('--once', action='store_true', help='한 번만 실행 (오늘 날짜 기준 API 호출)')
     cli_args = cli_parser.parse_args()
     
@@ -50,11 +53,12 @@ if __name__ == '__main__':
         pipeline.run_full_pipeline()
         
     else:
-        # 스케줄러로 매 시간 실행
+        # 스케줄러로 매 시간 실행 (트리거마다 refresh에서 커넥션을 새로 받음)
         scheduler = BlockingScheduler()
         schedule_config = get_schedule_config('hourly')  # 매시 5분에 실행
         scheduler.add_job(
             run_scheduled,
+            args=[cli_args],
             trigger=schedule_config['trigger'],
             id='unified_pipeline_hourly',
             name=f"통합 파이프라인 {schedule_config['description']}",
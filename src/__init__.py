@@ -1,6 +1,31 @@
-from .database import DBConnection, PostgresDB, TableEditor
-from .encoder import BaseTokenizer, BaseModel, EmbModel, KFDeBERTaTokenizer, KFDeBERTa, ModelTrainer, ModelPredictor
-from .ensemble import WeightedEnsemble
-from .llm import LLMOpenAI
-from .pipe import EnvManager, PreProcessor, DBManager, ModelManager, LLMManager, PipelineController, APIPipeline, UnifiedPipeline
-from .preprocessor import DataProcessor, TextProcessor, VecProcessor, TimeProcessor
\ No newline at end of file
+'''
+모듈은 처음 사용할 때 불러옵니다. (PEP 562)
+데이터 수집 스크립트처럼 HTTP/PostgreSQL만 사용하는 경우 torch, transformers, openai 등 무거운 패키지를 불러오지 않습니다.
+'''
+from importlib import import_module
+
+_LAZY_ATTRS = {
+    '.database': ['DBConnection', 'DBConnectionPool', 'PostgresDB', 'TableEditor', 'SchemaMigrator'],
+    '.cache': ['ClassificationCache', 'LLMResponseCache'],
+    '.encoder': ['BaseTokenizer', 'BaseModel', 'EmbModel', 'KFDeBERTaTokenizer', 'KFDeBERTa', 'ModelTrainer', 'ModelPredictor', 'ONNXModel', 'BatchingExecutor'],
+    '.ensemble': ['WeightedEnsemble'],
+    '.llm': ['LLMOpenAI'],
+    '.pipe': ['EnvManager', 'PreProcessor', 'DBManager', 'ModelManager', 'LLMManager', 'PipelineController', 'ClassificationWorker', 'ShardedReclassifier',
+              'APIPipeline', 'WatermarkManager', 'UnifiedPipeline'],
+    '.service': ['ClassificationService'],
+    '.preprocessor': ['DataProcessor', 'TextProcessor', 'VecProcessor', 'TimeProcessor', 'TickerMatcher', 'QueryFeatureExtractor'],
+}
+_ATTR_MODULES = {name: module for module, names in _LAZY_ATTRS.items() for name in names}
+__all__ = list(_ATTR_MODULES)
+
+
+def __getattr__(name):
+    if name not in _ATTR_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_ATTR_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,219 @@
+from collections import OrderedDict
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+import re
+import unicodedata
+
+
+def normalize_query(text):
+    '''
+    캐시 키 생성을 위해 질문을 정규화합니다. (NFKC, 앞뒤 공백 제거, 연속 공백 축약)
+    '''
+    return re.sub(r"\s+", " ", unicodedata.normalize('NFKC', str(text))).strip()
+
+
+def text_hash(text):
+    return hashlib.sha1(normalize_query(text).encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(*paths):
+    '''
+    경로(파일 또는 디렉토리) 아래 모든 파일의 이름, 크기, 수정 시각으로 버전 해시를 만듭니다.
+    model-update 가중치가 다시 저장되면 값이 바뀌므로, 캐시 무효화 기준으로 사용합니다.
+    '''
+    stats = []
+    for path in paths:
+        files = [path] if os.path.isfile(path) else \
+            sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        for file_path in files:
+            stat = os.stat(file_path)
+            stats.append(f"{os.path.relpath(file_path, path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha1('|'.join(stats).encode('utf-8')).hexdigest()
+
+
+class ClassificationCache:
+    '''
+    정규화한 질문 텍스트의 해시 -> (enc_res, 확률) 분류 결과 캐시
+    1차: 프로세스 내부 LRU, 2차: PostgreSQL 테이블 (text_hash, model_version 기준)
+    model_version이 바뀌면 이전 버전의 결과는 조회되지 않습니다. (PipelineController.refresh_model에서 purge_stale로 정리)
+    '''
+    def __init__(self, postgres, table_editor, table_name, model_version, maxsize=100000):
+        self.postgres = postgres
+        self.table_editor = table_editor
+        self.table_name = table_name
+        self.model_version = model_version
+        self.maxsize = maxsize
+        self.lru = OrderedDict()
+        self.hits, self.misses = 0, 0
+        self.table_editor.create_cls_cache_table(self.table_name)
+
+    def set_model_version(self, model_version):
+        '''
+        모델 버전이 바뀌면 LRU를 비웁니다.
+        '''
+        if model_version != self.model_version:
+            self.model_version = model_version
+            self.lru.clear()
+
+    def _remember(self, key, value):
+        self.lru[key] = value
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.maxsize:
+            self.lru.popitem(last=False)
+
+    def get_many(self, texts):
+        '''
+        args:
+        texts (iterable[str]): 질문 목록
+
+        returns:
+        dict: {text_hash: (enc_res, proba)} - 캐시에 있는 항목만 포함
+        '''
+        keys = {text_hash(text) for text in texts}
+        found = {}
+        for key in keys:
+            if key in self.lru:
+                self.lru.move_to_end(key)
+                found[key] = self.lru[key]
+        remaining = keys - found.keys()
+        if remaining:
+            for key, enc_res, proba in self.postgres.get_cls_cache(self.table_name, remaining, self.model_version):
+                found[key] = (enc_res, list(proba) if proba is not None else None)
+                self._remember(key, found[key])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        '''
+        args:
+        items (dict): {text_hash: (enc_res, proba)}
+        '''
+        if not items:
+            return
+        for key, value in items.items():
+            self._remember(key, value)
+        self.table_editor.upsert(
+            self.table_name, self.table_editor.CLS_CACHE_COLUMNS,
+            [(key, self.model_version, enc_res, proba) for key, (enc_res, proba) in items.items()],
+            conflict_columns=['text_hash', 'model_version'], update_columns=['enc_res', 'proba']
+        )
+
+    def purge_stale(self):
+        '''
+        현재 model_version이 아닌 캐시 항목을 삭제합니다.
+
+        returns:
+        int: 삭제한 행 수
+        '''
+        return self.table_editor.delete_stale_cls_cache(self.table_name, self.model_version)
+
+
+class LLMResponseCache:
+    '''
+    GPT 응답 캐시 (SQLite)
+    키: (model, system_role 해시, sub_role 해시, 정규화한 질문, temperature) - 프롬프트 문구가 바뀌면 키가 달라져 이전 응답은 사용하지 않습니다.
+    ttl_hours가 지난 항목은 조회하지 않고, max_entries를 넘으면 마지막 사용 시각이 오래된 항목부터 삭제합니다.
+    '''
+    def __init__(self, db_path, ttl_hours=168, max_entries=100000):
+        self.db_path = db_path
+        self.ttl = ttl_hours * 3600 if ttl_hours else None
+        self.max_entries = max_entries
+        self.hits, self.misses = 0, 0
+        self.lock = threading.Lock()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)   # 스케줄러 작업 스레드에서도 사용 (lock으로 직렬화)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_response_cache_accessed_at ON llm_response_cache (accessed_at)")
+
+    @staticmethod
+    def make_key(model, role, sub_role, query, temperature):
+        role_hash, sub_role_hash = (hashlib.sha1(str(prompt).encode('utf-8')).hexdigest() for prompt in (role, sub_role))
+        key = json.dumps([model, role_hash, sub_role_hash, normalize_query(query), float(temperature)], ensure_ascii=False)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        '''
+        returns:
+        dict: {cache_key: response} - TTL 이내 항목만 포함
+        '''
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self.lock, self.conn:
+            for start in range(0, len(keys), 500):   # SQLite 변수 개수 제한
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT cache_key, response, created_at FROM llm_response_cache WHERE cache_key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update({key: response for key, response, created_at in rows if self.ttl is None or now - created_at <= self.ttl})
+            if found:
+                self.conn.executemany("UPDATE llm_response_cache SET accessed_at = ? WHERE cache_key = ?", [(now, key) for key in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items, model=''):
+        '''
+        args:
+        items (dict): {cache_key: response}
+        '''
+        if not items:
+            return
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO llm_response_cache (cache_key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, model, response, now, now) for key, response in items.items()]
+            )
+            self._evict(now)
+
+    def put(self, key, response, model=''):
+        self.put_many({key: response}, model=model)
+
+    def _evict(self, now):
+        if self.ttl is not None:
+            self.conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl,))
+        if self.max_entries:
+            self.conn.execute(
+                """
+                DELETE FROM llm_response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else None, 'entries': len(self)}
+
+    def close(self):
+        self.conn.close()
@@ -1,5 +1,14 @@
 from abc import abstractmethod
+from contextlib import contextmanager
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import psycopg2 
+from datetime import datetime
+import pandas as pd
+from pandas.api.types import is_scalar
+import threading
+import time
+import uuid
 
 class DB():
     def __init__(self, config):
@@ -9,23 +18,122 @@ class DB():
     def connect():
         pass 
 
-class DBConnection(DB):
+class DBConnectionPool(DB):
+    '''
+    프로세스 수명 동안 유지되는 PostgreSQL 커넥션 풀
+    스케줄러가 작업을 트리거할 때마다 새로 연결하지 않고, 풀에서 커넥션을 빌려 쓰고 반납합니다.
+    db_config에 pool_min, pool_max, pool_idle_timeout(초) 값을 지정할 수 있습니다.
+    '''
+    _pools = {}
+    _lock = threading.Lock()
+
     def __init__(self, config):
         super().__init__(config)
-    
+        self.min_size = config.get('pool_min', 1)
+        self.max_size = config.get('pool_max', 5)
+        self.idle_timeout = config.get('pool_idle_timeout', 600)
+        self.last_used = {}
+        self.connect()
+
+    @classmethod
+    def get_pool(cls, config):
+        '''
+        동일한 접속 정보에 대해 하나의 풀만 생성해 재사용합니다.
+        '''
+        key = (config['host'], config['port'], config['db_name'], config['user_id'])
+        with cls._lock:
+            if key not in cls._pools or cls._pools[key].pool.closed:
+                cls._pools[key] = cls(config)
+            return cls._pools[key]
+
     def connect(self):
-        self.conn = psycopg2.connect(
+        self.pool = ThreadedConnectionPool(
+            self.min_size,
+            self.max_size,
             host=self.config['host'],
             dbname=self.config['db_name'],
             user=self.config['user_id'],
             password=self.config['user_pw'],
             port=self.config['port']
         )
+
+    def _is_healthy(self, conn):
+        '''
+        체크아웃 시점에 커넥션이 살아있는지 확인합니다. 
+        '''
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        '''
+        풀에서 커넥션을 가져옵니다. idle_timeout보다 오래 쉬었거나 끊어진 커넥션은 폐기 후 새로 연결합니다.
+        '''
+        for _ in range(self.max_size + 1):
+            conn = self.pool.getconn()
+            idle = time.time() - self.last_used.get(id(conn), time.time())
+            if idle <= self.idle_timeout and self._is_healthy(conn):
+                return conn
+            self.last_used.pop(id(conn), None)
+            self.pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("풀에서 사용 가능한 커넥션을 가져오지 못했습니다.")
+
+    def putconn(self, conn):
+        if not conn.closed:
+            conn.rollback()   # 커밋되지 않은 작업은 반납 시 정리
+        self.last_used[id(conn)] = time.time()
+        self.pool.putconn(conn, close=conn.closed)
+
+    @contextmanager
+    def unit_of_work(self):
+        '''
+        커넥션 하나로 작업 단위를 실행합니다. 정상 종료 시 커밋, 예외 발생 시 롤백 후 커넥션을 반납합니다.
+        상주 실행의 트리거마다 DBManager.unit_of_work -> PipelineController.unit_of_work로 사용합니다.
+        '''
+        db_connection = DBConnection(self.config, pool=self)
+        db_connection.connect()
+        try:
+            yield db_connection
+            db_connection.conn.commit()
+        except Exception:
+            db_connection.conn.rollback()
+            raise
+        finally:
+            db_connection.close()
+
+    def close(self):
+        self.pool.closeall()
+
+class DBConnection(DB):
+    def __init__(self, config, pool=None):
+        super().__init__(config)
+        self.pool = pool
+    
+    def connect(self):
+        if self.pool is not None:
+            self.conn = self.pool.getconn()
+        else:
+            self.conn = psycopg2.connect(
+                host=self.config['host'],
+                dbname=self.config['db_name'],
+                user=self.config['user_id'],
+                password=self.config['user_pw'],
+                port=self.config['port']
+            )
         self.cur = self.conn.cursor()
 
     def close(self):
         self.cur.close()
-        self.conn.close()
+        if self.pool is not None:
+            self.pool.putconn(self.conn)   # 풀 커넥션은 닫지 않고 반납
+        else:
+            self.conn.close()
     
 class PostgresDB:
     '''
@@ -34,29 +142,175 @@ class PostgresDB:
     def __init__(self, db_connection):
         self.db_connection = db_connection
 
-    def get_total_data(self, table_name):
+    def get_total_data(self, table_name, columns=None):
         '''
-        테이블에서 전체 데이터를 가져옵니다. 
+        테이블에서 전체 데이터를 가져옵니다. 테이블이 큰 경우 iter_total_data를 사용합니다.
         args:
         table_name (str)
+        columns (list[str]): 조회할 컬럼 (기본값: 전체 컬럼)
 
         returns:
         list[str]  - 자료형 확인 필요: 테이블 전체 데이터 
         '''
-        query = f"SELECT * FROM {table_name};"
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name};"
         self.db_connection.cur.execute(query)
         return self.db_connection.cur.fetchall()
 
+    def iter_total_data(self, table_name, columns=None, itersize=10000, as_dataframe=False):
+        '''
+        서버 측(named) 커서로 테이블 전체 데이터를 itersize 행씩 나누어 가져옵니다.
+        전체 결과를 한 번에 메모리에 올리지 않으므로, 재학습/전체 재분류를 일정한 메모리로 실행할 수 있습니다.
+        WITH HOLD 커서를 사용하므로, 순회 중 같은 커넥션에서 커밋(bulk_insert 등)해도 커서가 유지됩니다.
+        args:
+        table_name (str)
+        columns (list[str]): 조회할 컬럼 (기본값: 전체 컬럼)
+        itersize (int): 한 번에 가져올 행 수
+        as_dataframe (bool): True면 pd.DataFrame chunk, False면 list[tuple] chunk
+
+        yields:
+        list[tuple] | pd.DataFrame: 최대 itersize 행
+        '''
+        return self._iter_query(f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}", None, itersize, as_dataframe)
+
+    def iter_range_data(self, table_name, start_date, end_date, columns=None, itersize=10000, as_dataframe=False):
+        '''
+        start_date ~ end_date (포함, 20240130 형식) 기간의 데이터를 iter_total_data와 같은 방식으로 chunk 단위로 가져옵니다.
+        get_day_data와 같은 conv_id 접두사 범위 조건을 사용합니다.
+        '''
+        query = f"""SELECT {', '.join(columns) if columns else '*'} FROM {table_name}
+        WHERE conv_id COLLATE "C" >= %s AND conv_id COLLATE "C" < %s"""
+        return self._iter_query(query, (f"{start_date}_", f"{end_date}`"), itersize, as_dataframe)
+
+    def _iter_query(self, query, params, itersize, as_dataframe):
+        '''
+        서버 측(named) WITH HOLD 커서로 query 결과를 itersize 행씩 반환합니다.
+        '''
+        self.db_connection.conn.commit()
+        cur = self.db_connection.conn.cursor(name=f"iter_{uuid.uuid4().hex}", withhold=True)
+        cur.itersize = itersize
+        try:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(itersize)
+                if not rows:
+                    break
+                if as_dataframe:
+                    yield pd.DataFrame(rows, columns=[desc[0] for desc in cur.description])
+                else:
+                    yield rows
+        finally:
+            cur.close()
+            self.db_connection.conn.commit()
+
     def get_day_data(self, table_name, date):
         '''
         테이블에서 전일 데이터를 가져옵니다.
         args:
         date (str): 20240130 형식
+
+        conv_id 접두사('20240130_')를 C collation 범위 조건으로 조회하므로 (conv_id COLLATE "C") 인덱스
+        또는 월별 파티션(SchemaMigrator 참고)을 사용합니다. '`'는 C collation에서 '_' 바로 다음 문자입니다.
         '''
-        query = f"SELECT * FROM {table_name} WHERE SPLIT_PART(conv_id, '_', 1) = '{date}' ;"
-        self.db_connection.cur.execute(query)
+        query = f"""SELECT * FROM {table_name}
+        WHERE conv_id COLLATE "C" >= %s AND conv_id COLLATE "C" < %s;"""
+        self.db_connection.cur.execute(query, (f"{date}_", f"{date}`"))
+        return self.db_connection.cur.fetchall()
+
+    def get_question_counts_by_date(self, conv_table, cls_table=None, start_date=None, end_date=None):
+        '''
+        날짜(conv_id 접두사)별 사용자 질문(qa != 'A') 수를 날짜 순으로 반환합니다. 
+        cls_table을 지정하면 아직 분류되지 않은 질문만 셉니다.
+
+        returns:
+        list[tuple]: (20240130 형식 날짜, 질문 수)
+        '''
+        conditions, params = ["qa <> 'A'"], []
+        if start_date:
+            conditions.append('conv_id COLLATE "C" >= %s')
+            params.append(f"{start_date}_")
+        if end_date:
+            conditions.append('conv_id COLLATE "C" < %s')
+            params.append(f"{end_date}`")
+        if cls_table:
+            conditions.append(f"NOT EXISTS (SELECT 1 FROM {cls_table} c WHERE c.conv_id = {conv_table}.conv_id)")
+        self.db_connection.conn.commit()
+        self.db_connection.cur.execute(
+            f"""SELECT LEFT(conv_id, 8) AS pk_date, COUNT(*) FROM {conv_table}
+            WHERE {' AND '.join(conditions)} GROUP BY 1 ORDER BY 1""",
+            tuple(params)
+        )
         return self.db_connection.cur.fetchall()
 
+    def allocate_conv_seq(self, counter_table, conv_table, date_counts):
+        '''
+        날짜별 conv_id 일련번호 블록을 원자적으로 예약합니다. 여러 수집 프로세스가 동시에 실행되어도 번호가 겹치지 않습니다.
+        카운터 테이블에 처음 등장하는 날짜는 conv 테이블의 기존 최대 번호로 한 번만 초기화합니다.
+        예약 직후 커밋하므로, 이후 저장이 실패하면 해당 번호는 비어있게 됩니다. (sequence와 동일)
+        args:
+        counter_table (str): 날짜별 카운터 테이블 이름
+        conv_table (str): 대화 로그 테이블 이름
+        date_counts (dict): {20240130 형식 날짜: 필요한 번호 개수}
+
+        returns:
+        dict: {날짜: 예약된 블록의 시작 직전 번호} - 예약된 번호는 (값 + 1) ~ (값 + 개수)
+        '''
+        date_counts = {pk_date: int(count) for pk_date, count in date_counts.items() if count > 0}
+        if not date_counts:
+            return {}
+        try:
+            self.db_connection.cur.execute(
+                f"SELECT pk_date FROM {counter_table} WHERE pk_date = ANY(%s)", (list(date_counts),)
+            )
+            known_dates = {row[0] for row in self.db_connection.cur.fetchall()}
+            for pk_date in date_counts.keys() - known_dates:    # 새 날짜 초기화 (날짜당 한 번)
+                self.db_connection.cur.execute(
+                    f"""INSERT INTO {counter_table} (pk_date, last_seq)
+                    SELECT %s, COALESCE(MAX(CAST(SPLIT_PART(conv_id, '_', 2) AS INTEGER)), 0) FROM {conv_table}
+                    WHERE conv_id LIKE %s AND SPLIT_PART(conv_id, '_', 2) ~ '^[0-9]+$'
+                    ON CONFLICT (pk_date) DO NOTHING""",
+                    (pk_date, f"{pk_date}_%")
+                )
+            reserved = execute_values(
+                self.db_connection.cur,
+                f"""UPDATE {counter_table} AS c SET last_seq = c.last_seq + v.cnt
+                FROM (VALUES %s) AS v(pk_date, cnt) WHERE c.pk_date = v.pk_date
+                RETURNING c.pk_date, c.last_seq""",
+                list(date_counts.items()),
+                fetch=True
+            )
+            self.db_connection.conn.commit()
+        except Exception:
+            self.db_connection.conn.rollback()
+            raise
+        return {pk_date: last_seq - date_counts[pk_date] for pk_date, last_seq in reserved}
+
+    def get_watermark(self, table_name, tenant_id):
+        '''
+        tenant별로 마지막으로 저장한 API 데이터의 date(UTC) 값을 반환합니다. 저장된 값이 없으면 None을 반환합니다.
+        '''
+        self.db_connection.conn.commit()
+        self.db_connection.cur.execute(f"SELECT last_date FROM {table_name} WHERE tenant_id = %s", (tenant_id,))
+        result = self.db_connection.cur.fetchone()
+        return result[0] if result else None
+
+    def get_cls_cache(self, table_name, text_hashes, model_version, batch_size=5000):
+        '''
+        분류 결과 캐시 테이블에서 model_version이 일치하는 항목을 일괄 조회합니다.
+
+        returns:
+        list[tuple]: (text_hash, enc_res, proba)
+        '''
+        text_hashes = list(text_hashes)
+        rows = []
+        self.db_connection.conn.commit()
+        for start in range(0, len(text_hashes), batch_size):
+            self.db_connection.cur.execute(
+                f"SELECT text_hash, enc_res, proba FROM {table_name} WHERE model_version = %s AND text_hash = ANY(%s)",
+                (model_version, text_hashes[start:start + batch_size])
+            )
+            rows.extend(self.db_connection.cur.fetchall())
+        return rows
+
     def check_pk(self, table_name, pk_value):
         '''
         테이블에 Primary Key(PK)가 존재하는지 확인합니다. 이미 존재하는 PK인 경우, True를 반환합니다. 
@@ -68,6 +322,29 @@ class PostgresDB:
         result = self.db_connection.cur.fetchone()
         return result[0] if result else False
     
+    def get_existing_pks(self, table_name, pk_values, batch_size=5000):
+        '''
+        입력된 conv_id 중 테이블에 이미 존재하는 PK 집합을 반환합니다.
+        check_pk를 행마다 호출하는 대신, batch_size 단위로 한 번의 쿼리(= ANY)로 조회합니다.
+
+        args:
+        table_name (str): 테이블 이름
+        pk_values (iterable[str]): 조회할 conv_id 목록
+
+        returns:
+        set[str]: 이미 저장된 conv_id 집합
+        '''
+        pk_values = list({pk for pk in pk_values if pk is not None})
+        existing_pks = set()
+        self.db_connection.conn.commit()
+        for start in range(0, len(pk_values), batch_size):
+            self.db_connection.cur.execute(
+                f"SELECT conv_id FROM {table_name} WHERE conv_id = ANY(%s)",
+                (pk_values[start:start + batch_size],)
+            )
+            existing_pks.update(row[0] for row in self.db_connection.cur.fetchall())
+        return existing_pks
+
     def check_hash_duplicate(self, table_name, hash_value):
         '''
         테이블에 동일한 hash_value가 존재하는지 확인합니다. 
@@ -84,16 +361,294 @@ class PostgresDB:
         self.db_connection.cur.execute(f"SELECT EXISTS(SELECT 1 FROM {table_name} WHERE hash_value = %s)", (hash_value,))
         result = self.db_connection.cur.fetchone()
         return result[0] if result else False
-       
+
+    def get_existing_hashes(self, table_name, hash_values, batch_size=5000):
+        '''
+        입력된 hash_value 중 테이블에 이미 존재하는 해시값 집합을 반환합니다.
+        check_hash_duplicate를 행마다 호출하는 대신, batch_size 단위로 한 번의 쿼리(= ANY)로 조회합니다.
+
+        args:
+        table_name (str): 테이블 이름
+        hash_values (iterable[str]): 조회할 해시값 목록
+        batch_size (int): 한 번의 쿼리에 포함할 해시값 개수
+
+        returns:
+        set[str]: 이미 저장된 해시값 집합
+        '''
+        hash_values = list({h for h in hash_values if h is not None})
+        existing_hashes = set()
+        self.db_connection.conn.commit()
+        for start in range(0, len(hash_values), batch_size):
+            self.db_connection.cur.execute(
+                f"SELECT hash_value FROM {table_name} WHERE hash_value = ANY(%s)",
+                (hash_values[start:start + batch_size],)
+            )
+            existing_hashes.update(row[0] for row in self.db_connection.cur.fetchall())
+        return existing_hashes
+
+    def find_duplicate_hashes(self, table_name, hash_values):
+        '''
+        get_existing_hashes로 중복 해시값을 일괄 조회하고, 실패한 경우 check_hash_duplicate로 행 단위 조회합니다.
+
+        returns:
+        set[str]: 이미 저장된 해시값 집합
+        '''
+        try:
+            return self.get_existing_hashes(table_name, hash_values)
+        except psycopg2.Error:
+            self.db_connection.conn.rollback()
+            return {h for h in set(hash_values) if h is not None and self.check_hash_duplicate(table_name, h)}
+
 
 class TableEditor:
-    def __init__(self, db_connection):
+    CONV_COLUMNS = ['conv_id', 'date', 'qa', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']
+    CLS_COLUMNS = ['conv_id', 'ensemble']
+    CLICKED_COLUMNS = ['conv_id', 'clicked', 'user_id']
+    CLS_CACHE_COLUMNS = ['text_hash', 'model_version', 'enc_res', 'proba']
+    TICKER_COLUMNS = ['conv_id', 'tickers']
+
+    def __init__(self, db_connection, page_size=1000):
         self.db_connection = db_connection
+        self.page_size = page_size
+
+    def _to_rows(self, data, columns):
+        '''
+        DataFrame 또는 튜플 iterable을 columns 순서의 튜플 리스트로 변환합니다.
+        튜플 iterable의 경우 앞에서부터 columns 순서로 값이 들어있다고 가정합니다. (conv 테이블은 raw 형식과 동일)
+
+        returns:
+        list[str]: 실제로 삽입할 컬럼 이름 
+        list[tuple]: 삽입할 행 데이터
+        '''
+        if hasattr(data, 'columns'):
+            data = data.rename(columns={'q/a': 'qa'})
+            cols = [col for col in columns if col in data.columns]
+            # NaN, NaT, pd.NA -> NULL (리스트 등 스칼라가 아닌 값은 그대로)
+            rows = [tuple(None if is_scalar(v) and pd.isna(v) else v for v in row) for row in data[cols].itertuples(index=False, name=None)]
+            return cols, rows
+        rows = [tuple(row) for row in data]
+        if not rows:
+            return columns, rows
+        return columns[:len(rows[0])], rows
+
+    def bulk_insert(self, table_name, columns, data, page_size=None):
+        '''
+        여러 행을 execute_values로 한 번에 삽입하고, 배치 전체를 하나의 트랜잭션으로 커밋합니다. 
+        args:
+        table_name (str): 테이블 이름
+        columns (list[str]): 테이블 컬럼 순서 
+        data (pd.DataFrame | iterable[tuple]): 삽입할 데이터
+        page_size (int): 하나의 INSERT 문에 포함할 행 수 (기본값: self.page_size)
+
+        returns:
+        int: 삽입한 행 수
+        '''
+        cols, rows = self._to_rows(data, columns)
+        if not rows:
+            return 0
+        try:
+            execute_values(
+                self.db_connection.cur,
+                f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES %s",
+                rows,
+                page_size=page_size or self.page_size
+            )
+            self.db_connection.conn.commit()
+        except Exception:
+            self.db_connection.conn.rollback()
+            raise
+        return len(rows)
+
+    def upsert(self, table_name, columns, data, conflict_columns=None, update_columns=None, page_size=None):
+        '''
+        INSERT ... ON CONFLICT 로 여러 행을 한 번에 저장합니다. 존재 여부를 미리 조회하지 않고 테이블의 UNIQUE 제약(PK, hash_value)에
+        맡기므로, 동시에 실행된 작업끼리도 같은 행이 두 번 저장되지 않습니다.
+        update_columns가 없으면 DO NOTHING, 있으면 conflict_columns 기준으로 해당 컬럼을 갱신(DO UPDATE)합니다.
+        args:
+        table_name (str): 테이블 이름
+        columns (list[str]): 테이블 컬럼 순서
+        data (pd.DataFrame | iterable[tuple]): 저장할 데이터
+        conflict_columns (list[str]): 충돌 판단 컬럼 (DO UPDATE 시 필수, 기본값: 모든 UNIQUE 제약)
+        update_columns (list[str]): 충돌 시 갱신할 컬럼
+
+        returns:
+        tuple[int, int]: (신규 삽입 행 수, 건너뛴 행 수) - DO UPDATE의 경우 건너뛴 행은 갱신된 기존 행입니다.
+        '''
+        cols, rows = self._to_rows(data, columns)
+        if not rows:
+            return 0, 0
+        if update_columns:
+            # 한 문장 안에서 같은 키를 두 번 갱신할 수 없으므로, 키가 같은 행은 마지막 행만 남깁니다.
+            key_idx = [cols.index(col) for col in conflict_columns]
+            rows = list({tuple(row[i] for i in key_idx): row for row in rows}.values())
+            conflict = f"ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET " + \
+                ', '.join(f"{col} = EXCLUDED.{col}" for col in update_columns)
+        else:
+            conflict = f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING" if conflict_columns else "ON CONFLICT DO NOTHING"
+        try:
+            # xmax = 0 인 행은 이번 문장에서 새로 삽입된 행 (갱신된 행은 xmax가 설정됨)
+            returned = execute_values(
+                self.db_connection.cur,
+                f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES %s {conflict} RETURNING (xmax = 0)",
+                rows,
+                page_size=page_size or self.page_size,
+                fetch=True
+            )
+            self.db_connection.conn.commit()
+        except Exception:
+            self.db_connection.conn.rollback()
+            raise
+        inserted = sum(1 for (is_insert,) in returned if is_insert)
+        return inserted, len(rows) - inserted
+
+    def insert_new_hashes(self, table_name, columns, data, page_size=None):
+        '''
+        hash_value UNIQUE 인덱스를 만들 수 없는 파티션 테이블용 저장 함수입니다. (ON CONFLICT (hash_value) 대신 사용)
+        테이블 단위 advisory lock을 잡은 상태에서 find_duplicate_hashes로 이미 저장된 해시를 제외하고 나머지를 한 번에 삽입하므로,
+        동시에 실행된 작업끼리도 같은 hash_value가 두 번 저장되지 않습니다. conv_id 충돌은 upsert와 같이 오류를 발생시킵니다.
+
+        returns:
+        tuple[int, int]: (신규 삽입 행 수, 건너뛴 행 수)
+        '''
+        cols, rows = self._to_rows(data, columns)
+        if not rows:
+            return 0, 0
+        hash_idx = cols.index('hash_value')
+        cur = self.db_connection.cur
+        cur.execute("SELECT pg_advisory_lock(hashtext(%s))", (table_name,))   # 커밋과 무관하게 unlock 전까지 유지되는 세션 잠금
+        try:
+            seen = PostgresDB(self.db_connection).find_duplicate_hashes(table_name, [row[hash_idx] for row in rows])
+            new_rows = []
+            for row in rows:   # 배치 안에서 같은 해시가 반복되면 첫 행만 저장
+                if row[hash_idx] is None or row[hash_idx] not in seen:
+                    new_rows.append(row)
+                    seen.add(row[hash_idx])
+            try:
+                if new_rows:
+                    execute_values(cur, f"INSERT INTO {table_name} ({', '.join(cols)}) VALUES %s", new_rows,
+                                   page_size=page_size or self.page_size)
+                self.db_connection.conn.commit()
+            except Exception:
+                self.db_connection.conn.rollback()
+                raise
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (table_name,))
+            self.db_connection.conn.commit()
+        return len(new_rows), len(rows) - len(new_rows)
+
+    def create_conv_table(self, table_name):
+        '''
+        대화 로그 테이블을 생성하고, hash_value UNIQUE 인덱스가 있는지 확인합니다.
+        edit_conv_table(data_type='upsert')는 hash_value 충돌만 중복으로 건너뛰므로 이 인덱스가 반드시 필요합니다.
+        (conv_id 충돌은 건너뛰지 않고 오류를 발생시켜 신규 질문이 조용히 버려지지 않도록 합니다.)
+        파티션 테이블은 hash_value 단독 UNIQUE 인덱스를 만들 수 없으므로 일반 인덱스를 만들고, 저장 시 insert_new_hashes로 중복을 제외합니다.
+        기존 데이터에 중복 해시가 있어 UNIQUE 인덱스를 만들 수 없는 경우 RuntimeError를 발생시킵니다.
+        '''
+        cur = self.db_connection.cur
+        try:
+            cur.execute(
+                f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                    conv_id VARCHAR(64) COLLATE "C" PRIMARY KEY,
+                    date TIMESTAMP,
+                    qa VARCHAR(8),
+                    content TEXT,
+                    user_id VARCHAR(128),
+                    tenant_id VARCHAR(32),
+                    hash_value VARCHAR(64),
+                    hash_ref VARCHAR(64)
+                )"""
+            )
+            if SchemaMigrator(self.db_connection).is_partitioned(table_name):
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_hash_value_idx ON {table_name} (hash_value)")
+            else:
+                cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_hash_value_key ON {table_name} (hash_value)")
+            self.db_connection.conn.commit()
+        except psycopg2.IntegrityError as e:
+            self.db_connection.conn.rollback()
+            raise RuntimeError(f"{table_name}에 중복 hash_value가 있어 UNIQUE 인덱스를 만들 수 없습니다. "
+                               "database_cleanup.py로 중복을 정리한 뒤 다시 실행하세요.") from e
+        except Exception:
+            self.db_connection.conn.rollback()
+            raise
+
+    def create_conv_id_counter_table(self, table_name):
+        '''
+        날짜별 conv_id 일련번호 카운터 테이블을 생성합니다.
+        '''
+        self.db_connection.cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                pk_date CHAR(8) PRIMARY KEY,
+                last_seq INTEGER NOT NULL
+            )"""
+        )
+        self.db_connection.conn.commit()
+
+    def create_cls_cache_table(self, table_name):
+        '''
+        질문 텍스트 해시별 분류 결과 캐시 테이블을 생성합니다. 
+        '''
+        self.db_connection.cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                text_hash CHAR(40) NOT NULL,
+                model_version CHAR(40) NOT NULL,
+                enc_res CHAR(1) NOT NULL,
+                proba DOUBLE PRECISION[],
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (text_hash, model_version)
+            )"""
+        )
+        self.db_connection.conn.commit()
+
+    def create_ticker_table(self, table_name):
+        '''
+        질문(conv_id)별 언급 종목 테이블을 생성합니다. 종목이 없는 질문은 빈 배열로 저장합니다.
+        '''
+        self.db_connection.cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                conv_id VARCHAR(64) PRIMARY KEY,
+                tickers TEXT[] NOT NULL
+            )"""
+        )
+        self.db_connection.conn.commit()
+
+    def delete_stale_cls_cache(self, table_name, model_version):
+        '''
+        현재 모델 버전이 아닌 분류 결과 캐시를 삭제합니다.
+        '''
+        self.db_connection.cur.execute(f"DELETE FROM {table_name} WHERE model_version <> %s", (model_version,))
+        deleted = self.db_connection.cur.rowcount
+        self.db_connection.conn.commit()
+        return deleted
+
+    def create_watermark_table(self, table_name):
+        '''
+        tenant별 수집 워터마크(마지막으로 저장한 date) 테이블을 생성합니다.
+        '''
+        self.db_connection.cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                tenant_id VARCHAR(32) PRIMARY KEY,
+                last_date TIMESTAMPTZ NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )"""
+        )
+        self.db_connection.conn.commit()
+
+    def update_watermark(self, table_name, tenant_id, last_date):
+        '''
+        tenant의 워터마크를 갱신합니다. 기존 값보다 과거인 date로는 되돌리지 않습니다.
+        '''
+        self.db_connection.cur.execute(
+            f"""INSERT INTO {table_name} (tenant_id, last_date) VALUES (%s, %s)
+            ON CONFLICT (tenant_id) DO UPDATE
+            SET last_date = GREATEST({table_name}.last_date, EXCLUDED.last_date), updated_at = NOW()""",
+            (tenant_id, last_date)
+        )
+        self.db_connection.conn.commit()
 
     def edit_conv_table(self, task, table_name, data_type=None, data=None, col=None, val=None):
         '''
         insert, delete, update
-        data_type = raw or table
+        data_type = raw, table, bulk or upsert
         '''
         if task == 'insert':
             if data_type == 'table':
@@ -123,6 +678,14 @@ class TableEditor:
                 else:
                     raise ValueError(f"지원하지 않는 데이터 형식입니다. 길이: {len(data)}")
                 self.db_connection.conn.commit()
+            elif data_type == 'bulk':
+                # DataFrame 또는 raw 형식 튜플 목록을 한 번의 트랜잭션으로 저장
+                return self.bulk_insert(table_name, self.CONV_COLUMNS, data)
+            elif data_type == 'upsert':
+                # 같은 내용(hash_value)만 건너뜀 -> (삽입, 건너뜀) 반환. conv_id 충돌은 오류 발생 (create_conv_table 필요)
+                if SchemaMigrator(self.db_connection).is_partitioned(table_name):   # hash_value UNIQUE 인덱스 없음
+                    return self.insert_new_hashes(table_name, self.CONV_COLUMNS, data)
+                return self.upsert(table_name, self.CONV_COLUMNS, data, conflict_columns=['hash_value'])
         elif task == 'delete':
             pass 
         elif task == 'update':
@@ -143,6 +706,10 @@ class TableEditor:
                     tuple(data)
                 )
                 self.db_connection.conn.commit()
+            elif data_type=='bulk':
+                return self.bulk_insert(table_name, self.CLS_COLUMNS, data)
+            elif data_type=='upsert':
+                return self.upsert(table_name, self.CLS_COLUMNS, data)
         elif task == 'delete':
             pass 
         elif task == 'update':
@@ -163,7 +730,141 @@ class TableEditor:
                     tuple(data)
                 )
                 self.db_connection.conn.commit()
+            elif data_type=='bulk':
+                return self.bulk_insert(table_name, self.CLICKED_COLUMNS, data)
+            elif data_type=='upsert':
+                return self.upsert(table_name, self.CLICKED_COLUMNS, data)
         elif task == 'delete':
             pass 
         elif task == 'update':
             pass
+
+
+class SchemaMigrator:
+    '''
+    대화 로그 테이블의 인덱스 생성 및 월별 파티션 전환에 사용되는 클래스
+    모든 작업은 IF NOT EXISTS 로 작성되어 여러 번 실행해도 안전합니다.
+    '''
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def _execute(self, statements):
+        '''
+        여러 DDL 문을 하나의 트랜잭션으로 실행합니다. 
+        '''
+        try:
+            for statement in statements:
+                self.db_connection.cur.execute(statement)
+            self.db_connection.conn.commit()
+        except Exception:
+            self.db_connection.conn.rollback()
+            raise
+
+    def is_partitioned(self, table_name):
+        self.db_connection.cur.execute(
+            "SELECT EXISTS(SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", (table_name,)
+        )
+        return self.db_connection.cur.fetchone()[0]
+
+    def create_indexes(self, table_name):
+        '''
+        get_day_data, 중복 해시 조회, 날짜/tenant 조회에 필요한 인덱스를 생성합니다.
+        hash_value는 UNIQUE 인덱스로 생성하되, 파티션 테이블이거나 기존 데이터에 중복 해시가 있으면 일반 인덱스로 생성합니다.
+        (파티션 테이블의 UNIQUE 인덱스는 파티션 키를 포함해야 하므로 hash_value 단독으로는 만들 수 없습니다.)
+
+        returns:
+        bool: hash_value 인덱스가 UNIQUE로 생성되었는지 여부
+        '''
+        partitioned = self.is_partitioned(table_name)
+        statements = [
+            f"CREATE INDEX IF NOT EXISTS {table_name}_date_idx ON {table_name} (date)",
+            f"CREATE INDEX IF NOT EXISTS {table_name}_tenant_id_idx ON {table_name} (tenant_id)",
+        ]
+        if not partitioned:   # 파티션 테이블은 conv_id 컬럼 자체가 C collation
+            statements.append(f'CREATE INDEX IF NOT EXISTS {table_name}_conv_id_c_idx ON {table_name} (conv_id COLLATE "C")')
+        self._execute(statements)
+
+        hash_index = f"CREATE INDEX IF NOT EXISTS {table_name}_hash_value_idx ON {table_name} (hash_value)"
+        if partitioned:
+            self._execute([hash_index])
+            return False
+        try:
+            self._execute([f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_hash_value_key ON {table_name} (hash_value)"])
+            return True
+        except psycopg2.IntegrityError:   # 기존 중복 해시 (database_cleanup.py로 정리 필요)
+            self._execute([hash_index])
+            return False
+
+    def _month_partition_statements(self, table_name, start_month, months_ahead):
+        year, month = int(start_month[:4]), int(start_month[4:6])
+        today = datetime.now()
+        end_index = today.year * 12 + today.month - 1 + months_ahead
+        statements, partitions = [], []
+        while year * 12 + month - 1 <= end_index:
+            next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+            lower, upper = f"{year}{month:02d}", f"{next_year}{next_month:02d}"
+            partition = f"{table_name}_p{lower}"
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table_name} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            )
+            partitions.append(partition)
+            year, month = next_year, next_month
+        return statements, partitions
+
+    def ensure_month_partitions(self, table_name, start_month=None, months_ahead=3):
+        '''
+        start_month(YYYYMM, 기본값: 현재 월)부터 현재 월 + months_ahead 까지의 월별 파티션을 생성합니다. 
+        파티션 범위는 conv_id 접두사 기준 ['YYYYMM', 다음 달 'YYYYMM') 입니다.
+        해당 기간의 데이터가 이미 DEFAULT 파티션에 있으면 생성에 실패하므로, 미리 months_ahead 만큼 만들어 둡니다.
+
+        returns:
+        list[str]: 대상 파티션 이름 목록
+        '''
+        statements, partitions = self._month_partition_statements(
+            table_name, start_month or datetime.now().strftime("%Y%m"), months_ahead
+        )
+        self._execute(statements)
+        return partitions
+
+    def partition_by_month(self, table_name, months_ahead=3, drop_legacy=False):
+        '''
+        기존 테이블을 conv_id 접두사(YYYYMM) 기준 월별 네이티브 파티션 테이블로 전환합니다. 
+        1. 기존 테이블과 인덱스 이름을 *_legacy 로 변경
+        2. conv_id를 C collation으로 정의한 파티션 테이블 생성 (PRIMARY KEY (conv_id))
+        3. 기존 데이터 기간 ~ 현재 월 + months_ahead 의 월별 파티션과 DEFAULT 파티션 생성 후 데이터 복사
+        전체 과정은 하나의 트랜잭션으로 실행되며, 다른 테이블의 외래키는 전환 후 다시 연결해야 합니다.
+
+        returns:
+        list[str]: 생성한 월별 파티션 이름 목록
+        '''
+        if self.is_partitioned(table_name):
+            return []
+        cur = self.db_connection.cur
+        legacy = f"{table_name}_legacy"
+        cur.execute(
+            """SELECT string_agg(quote_ident(attname) || ' ' || format_type(atttypid, atttypmod)
+                || CASE WHEN attname = 'conv_id' THEN ' COLLATE "C"' ELSE '' END
+                || CASE WHEN attnotnull THEN ' NOT NULL' ELSE '' END, ', ' ORDER BY attnum)
+            FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped""",
+            (table_name,)
+        )
+        column_defs = cur.fetchone()[0]
+        cur.execute(f"SELECT MIN(LEFT(conv_id, 6)) FROM {table_name} WHERE conv_id ~ '^[0-9]{{8}}_'")
+        start_month = cur.fetchone()[0] or datetime.now().strftime("%Y%m")
+        cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (table_name,))
+        index_names = [row[0] for row in cur.fetchall()]
+        self.db_connection.conn.commit()
+
+        statements = [f"ALTER INDEX {index_name} RENAME TO {index_name}_legacy" for index_name in index_names]
+        statements += [
+            f"ALTER TABLE {table_name} RENAME TO {legacy}",
+            f"CREATE TABLE {table_name} ({column_defs}, PRIMARY KEY (conv_id)) PARTITION BY RANGE (conv_id)",
+            f"CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT",
+        ]
+        partition_statements, partitions = self._month_partition_statements(table_name, start_month, months_ahead)
+        statements += partition_statements
+        statements.append(f"INSERT INTO {table_name} SELECT * FROM {legacy}")
+        if drop_legacy:
+            statements.append(f"DROP TABLE {legacy}")
+        self._execute(statements)
+        return partitions
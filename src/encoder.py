@@ -2,9 +2,17 @@ from abc import ABC, abstractmethod
 from transformers import TrainingArguments, Trainer, EarlyStoppingCallback
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from transformers import DataCollatorWithPadding
+from transformers.modeling_outputs import SequenceClassifierOutput
+from concurrent.futures import Future
+from collections import Counter
 import numpy as np 
 import evaluate
 import torch
+import threading
+import asyncio
+import logging
+import queue
+import time
 import os
 
 class BaseTokenizer(ABC):
@@ -107,6 +115,15 @@ class KFDeBERTaTokenizer(BaseTokenizer):
                 tokenized_inputs['label'] = torch.tensor(dataset['label']) 
             return tokenized_inputs
     
+    def count_tokens(self, texts):
+        '''
+        여러 text의 토큰 개수를 한 번의 배치 토큰화로 계산합니다. (special token 제외, len(tokenize_data(text))와 동일)
+        '''
+        texts = list(texts)
+        if not texts:
+            return []
+        return [len(input_ids) for input_ids in self.tokenizer(texts, add_special_tokens=False)['input_ids']]
+
     def save_tokenizer(self, tokenizer_path):
         self.tokenizer.save_pretrained(tokenizer_path)
         
@@ -138,6 +155,65 @@ class KFDeBERTa(BaseModel):
     def save_model(self, model_path):
         self.model.save_pretrained(model_path)
 
+    def export_onnx(self, onnx_path, tokenizer, opset_version=17):
+        '''
+        모델을 ONNX 형식으로 저장합니다. 배치 크기와 문장 길이는 동적 축으로 지정합니다.
+        args:
+        onnx_path (str): 저장 경로
+        tokenizer: 예시 입력 생성에 사용할 토크나이저 (AutoTokenizer)
+        '''
+        self.model.eval()
+        sample = tokenizer(["삼성전자 주가 전망 알려줘"], return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]   # forward 인자 순서
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['logits'] = {0: 'batch'}
+        with torch.no_grad():   # tracer는 inference tensor를 지원하지 않으므로 inference_mode 대신 no_grad 사용
+            torch.onnx.export(
+                self.model,
+                tuple(sample[name] for name in input_names),
+                onnx_path,
+                input_names=input_names,
+                output_names=['logits'],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset_version,
+                do_constant_folding=True
+            )
+        return onnx_path
+
+    @staticmethod
+    def quantize_onnx(onnx_path, quantized_path):
+        '''
+        ONNX 모델의 가중치를 INT8로 동적 양자화합니다. (CPU 추론용)
+        '''
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+
+class ONNXModel:
+    '''
+    ONNX Runtime 세션을 transformers 모델처럼 호출할 수 있게 감싼 클래스 
+    ModelPredictor의 model 자리에 그대로 사용하며, logits를 torch tensor로 반환하므로 예측 코드는 백엔드와 관계없이 동일합니다.
+    '''
+    def __init__(self, onnx_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs):
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        logits = self.session.run(['logits'], feed)[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+
 class ModelTrainer:
     def __init__(self, tokenizer=None, model=None, training_args=None):
         self.tokenizer = tokenizer 
@@ -172,6 +248,113 @@ class ModelTrainer:
         self.model.save_pretrained(model_path)
 
     
+class BatchingExecutor:
+    '''
+    여러 스레드/코루틴에서 들어온 요청을 모아 한 번에 처리하는 micro-batching 실행기
+    첫 요청이 들어온 뒤 max_wait_ms 동안, 또는 max_batch_size개가 모일 때까지 기다렸다가 batch_fn(items)을 한 번 호출하고
+    각 요청의 Future에 결과를 돌려줍니다.
+    args:
+    batch_fn (callable): list -> 입력 순서대로의 결과 list
+    '''
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5, name='batching-executor'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batch_sizes = Counter()
+        self.closed = False
+        self.close_lock = threading.Lock()   # closed 확인과 put 사이에 close()가 끼어들지 않도록 보호
+        self.worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        '''
+        returns:
+        concurrent.futures.Future: batch_fn 결과 중 item에 해당하는 값
+        '''
+        future = Future()
+        with self.close_lock:
+            if self.closed:
+                raise RuntimeError("종료된 BatchingExecutor입니다.")
+            self.requests.put((item, future))
+        return future
+
+    def submit_many(self, items):
+        return [self.submit(item) for item in items]
+
+    def map(self, items, timeout=None):
+        return [future.result(timeout=timeout) for future in self.submit_many(items)]
+
+    async def asubmit(self, item):
+        '''
+        asyncio 코루틴에서 사용합니다. (이벤트 루프를 막지 않음)
+        '''
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self):
+        first = self.requests.get()
+        if first is None:
+            return None
+        pending = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:   # 대기 시간이 지나도 이미 도착한 요청은 함께 처리
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:   # close() 이후에는 남은 요청만 처리
+                self.requests.put(None)
+                break
+            pending.append(request)
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            if pending is None:
+                return
+            pending = [(item, future) for item, future in pending if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            try:
+                results = self.batch_fn([item for item, _ in pending])
+            except Exception as e:
+                logging.getLogger(__name__).error(f"배치 처리 중 오류 발생: {str(e)}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batch_sizes[len(pending)] += 1
+            for (_, future), result in zip(pending, results):
+                future.set_result(result)
+
+    def stats(self):
+        '''
+        returns:
+        dict: batches (배치 수), items (처리 요청 수), avg_batch_size, histogram ({배치 크기: 횟수})
+        '''
+        histogram = dict(sorted(self.batch_sizes.items()))
+        n_batches = sum(histogram.values())
+        n_items = sum(size * count for size, count in histogram.items())
+        return {
+            'batches': n_batches,
+            'items': n_items,
+            'avg_batch_size': n_items / n_batches if n_batches else None,
+            'histogram': histogram,
+        }
+
+    def close(self, wait=True):
+        '''
+        새 요청을 받지 않고, 이미 들어온 요청을 처리한 뒤 작업 스레드를 종료합니다.
+        '''
+        with self.close_lock:
+            if not self.closed:
+                self.closed = True
+                self.requests.put(None)
+        if wait:
+            self.worker.join()
+
+
 class ModelPredictor:
     def __init__(self, tokenizer, model):
         self.tokenizer = tokenizer
@@ -179,7 +362,26 @@ class ModelPredictor:
         self.id2label = {0: "stock", 1: "nstock"}
         self.label2id = {"stock": 0, "nstock": 1}
         self.accuracy = evaluate.load("accuracy")
+        self.executor = None
     
+    def start_batching(self, max_batch_size=32, max_wait_ms=5):
+        '''
+        동시에 호출된 predict / predict_proba를 모아 한 번의 forward pass로 처리하도록 BatchingExecutor를 시작합니다.
+        '''
+        if self.executor is None:
+            self.executor = BatchingExecutor(self._predict_items, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                             name='predictor-batcher')
+        return self.executor
+
+    def stop_batching(self):
+        if self.executor is not None:
+            self.executor.close()
+            self.executor = None
+
+    def _predict_items(self, texts):
+        labels, probas = self.predict_batch(texts, batch_size=len(texts))
+        return list(zip(labels, probas))
+
     def predict(self, text):
         '''
         text가 증권 종목 분석 질문인지 아닌지 예측합니다.
@@ -189,6 +391,8 @@ class ModelPredictor:
         returns:
         str: 증권 종목인 경우 stock, 증권 종목이 아닌 경우 nstock 반환
         '''
+        if self.executor is not None:
+            return self.executor.submit(text).result()[0]
         inputs = self.tokenizer(text, truncation=True, return_tensors='pt')
         # print(f'len of toks: {len(self.tokenize_txt(text))}')   # 앞과 뒤에 SPECIAL TOKEN 추가됨 (+2)
         model_output = self.model(**inputs)
@@ -203,12 +407,64 @@ class ModelPredictor:
         returns: 
         list: 합한 값이 1이 되는 레이블별 확률 값 리스트
         '''
+        if self.executor is not None:
+            return self.executor.submit(text).result()[1]
         import torch.nn.functional as F
         inputs = self.tokenizer(text, truncation=True, return_tensors='pt')
         model_output = self.model(**inputs)
         # print(f'shape of model output: {np.shape(model_output.last_hidden_state)}')
         return F.softmax(model_output.logits, dim=-1)[0].tolist()
 
+    def predict_batch(self, texts, batch_size=32):
+        '''
+        여러 text를 배치 단위로 예측합니다. 패딩을 줄이기 위해 토큰 길이 순으로 정렬한 뒤 배치를 구성하고,
+        autograd 없이(torch.inference_mode) forward pass를 수행합니다. 
+        args:
+        texts (list[str])
+        batch_size (int): 한 번의 forward pass에 포함할 문장 수
+
+        returns:
+        list[str]: 입력 순서대로 stock / nstock 레이블 
+        list[list[float]]: 입력 순서대로 레이블별 확률 값 리스트
+        '''
+        import torch.nn.functional as F
+        texts = list(texts)
+        if not texts:
+            return [], []
+        encodings = self.tokenizer(texts, truncation=True)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings['input_ids'][i]))
+        labels, probas = [None] * len(texts), [None] * len(texts)
+
+        self.model.eval()
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                batch_idx = order[start:start + batch_size]
+                features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch_idx]
+                inputs = self.tokenizer.pad(features, return_tensors='pt')
+                model_output = self.model(**inputs)
+                batch_probas = F.softmax(model_output.logits, dim=-1)
+                batch_labels = torch.argmax(batch_probas, dim=1).tolist()
+                for i, label, proba in zip(batch_idx, batch_labels, batch_probas.tolist()):
+                    labels[i] = self.id2label[label]
+                    probas[i] = proba
+        return labels, probas
+
+    def compare(self, other, texts, batch_size=32):
+        '''
+        같은 text에 대해 다른 predictor(ex. onnx 백엔드)와 예측 결과를 비교합니다.
+        returns:
+        dict: label_agreement (레이블 일치 비율), max_abs_diff (확률 최대 오차), n (문장 수)
+        '''
+        labels, probas = self.predict_batch(texts, batch_size=batch_size)
+        other_labels, other_probas = other.predict_batch(texts, batch_size=batch_size)
+        if not labels:
+            return {'label_agreement': 1.0, 'max_abs_diff': 0.0, 'n': 0}
+        return {
+            'label_agreement': float(np.mean([a == b for a, b in zip(labels, other_labels)])),
+            'max_abs_diff': float(np.max(np.abs(np.array(probas) - np.array(other_probas)))),
+            'n': len(labels)
+        }
+
     def compute_metrics(self, eval_pred):
         predictions, labels = eval_pred
         predictions = np.argmax(predictions, axis=1)
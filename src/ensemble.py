@@ -38,4 +38,25 @@ class WeightedEnsemble():
         )
         print(weighted_preds)   # 0: 종목 x, 1: 종목
         final_preds = np.argmax(weighted_preds)
-        return 'o' if final_preds == 1 else 'x'   
\ No newline at end of file
+        return 'o' if final_preds == 1 else 'x'
+
+    def predict_batch(self, X_texts, X_features):
+        '''
+        여러 데이터를 한 번에 앙상블 예측합니다. GPT 응답은 get_responses로 동시에 요청합니다. (동시 요청 수, 분당 요청/토큰 수 제한)
+        args:
+        X_texts (list[str]): 텍스트 값 목록
+        X_features (array-like): 텍스트별 tf-idf 피처 값 (2차원)
+
+        returns:
+        list[str]: 입력 순서대로 'o' 또는 'x'
+        '''
+        gpt_responses = self.gpt_model.get_responses(X_texts, role=self.gpt_model.system_role, sub_role=self.gpt_model.stock_role)
+        gpt_proba = np.array([[0, 1] if response == '종목' else [1, 0] for response in gpt_responses])
+        kfdeberta_proba = np.array(self.kfdeberta_model.predict_batch(X_texts)[1])
+        lightgbm_proba = np.array(self.lightgbm_model.predict_proba(X_features))
+        weighted_preds = (
+            self.weights[0] * gpt_proba +
+            self.weights[1] * kfdeberta_proba +
+            self.weights[2] * lightgbm_proba
+        )
+        return ['o' if pred == 1 else 'x' for pred in np.argmax(weighted_preds, axis=1)]
@@ -1,11 +1,15 @@
 from transformers import AutoTokenizer, AutoModelForCausalLM, AutoConfig
 from transformers import GenerationConfig
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APIStatusError
 from abc import abstractmethod
+from collections import deque
 import numpy as np
 import transformers
 import warnings
+import asyncio
+import random
 import torch
+import time
 import os
 
 # 특정 경고 메시지 무시
@@ -25,10 +29,47 @@ class LLMModel():
             "temperature": temperature
         }
 
+class TokenBucket:
+    '''
+    분당 허용량(per_minute)을 초당 per_minute / 60 속도로 다시 채우는 토큰 버킷 (asyncio 이벤트 루프 안에서 사용)
+    '''
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
 class LLMOpenAI(LLMModel):
     def __init__(self, config):
         super().__init__(config)
-        self.client = OpenAI()
+        self.base_url = config.get('openai_base_url')   # 테스트용 mock 서버 주소 (기본값: OPENAI_BASE_URL 또는 OpenAI API)
+        self.client = OpenAI(base_url=self.base_url)
+        self.max_concurrency = config.get('max_concurrency', 8)
+        self.max_retries = config.get('max_retries', 5)
+        self.backoff_base, self.backoff_max = config.get('backoff_base', 1.0), config.get('backoff_max', 60.0)
+        self.request_bucket = TokenBucket(config['rpm_limit']) if config.get('rpm_limit') else None
+        self.token_bucket = TokenBucket(config['tpm_limit']) if config.get('tpm_limit') else None
+        self.call_logs = deque(maxlen=config.get('call_log_size', 10000))   # 최근 get_responses 호출별 latency, 토큰 사용량, 시도 횟수
+        self.response_cache = None
 
     def set_generation_config(self):
         self.gen_config = {
@@ -74,7 +115,25 @@ class LLMOpenAI(LLMModel):
         삼성전자 저평가야 ? 같은 질문이 들어오면 삼성전자만 반환하면 돼. 그 외 답변은 하지마. 
         """
 
+    def set_response_cache(self, response_cache):
+        '''
+        GPT 응답 캐시(LLMResponseCache)를 설정합니다. 같은 모델, 프롬프트, 질문, temperature의 응답은 다시 요청하지 않습니다.
+        '''
+        self.response_cache = response_cache
+
+    def _cache_key(self, query, role, sub_role, model):
+        return self.response_cache.make_key(model, role, sub_role, query, self.gen_config['temperature'])
+
+    @staticmethod
+    def _is_cacheable(response):
+        return isinstance(response, str) and not response.startswith('Error: ')
+
     def get_response(self, query, role="너는 금융권에서 일하고 있는 조수로, 사용자 질문에 대해 간단 명료하게 답을 해주면 돼", sub_role="", model='gpt-4o'):
+        cache_key = self._cache_key(query, role, sub_role, model) if self.response_cache is not None else None
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         try:
             sub_role = sub_role
             response = self.client.chat.completions.create(
@@ -89,7 +148,115 @@ class LLMOpenAI(LLMModel):
             )
         except Exception as e:
             return f"Error: {str(e)}"
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+        if cache_key is not None and self._is_cacheable(content):
+            self.response_cache.put(cache_key, content, model=model)
+        return content
+
+    def get_responses(self, queries, role="너는 금융권에서 일하고 있는 조수로, 사용자 질문에 대해 간단 명료하게 답을 해주면 돼", sub_role="", model='gpt-4o'):
+        '''
+        여러 질문을 동시에 요청합니다. (aget_responses를 새 이벤트 루프에서 실행, 이미 실행 중인 루프 안에서는 aget_responses 사용)
+        returns:
+        list[str]: 입력 순서대로 응답 (실패한 경우 get_response와 같이 "Error: ..." 문자열)
+        '''
+        return asyncio.run(self.aget_responses(queries, role=role, sub_role=sub_role, model=model))
+
+    async def aget_responses(self, queries, role="너는 금융권에서 일하고 있는 조수로, 사용자 질문에 대해 간단 명료하게 답을 해주면 돼", sub_role="", model='gpt-4o'):
+        '''
+        동시 요청 수는 max_concurrency로, 분당 요청/토큰 수는 rpm_limit, tpm_limit 토큰 버킷으로 제한합니다.
+        429, 5xx, 연결 오류는 jitter를 더한 지수 backoff로 max_retries회까지 다시 시도합니다.
+        응답 캐시가 설정된 경우 캐시에 있는 질문과 중복 질문은 요청하지 않습니다.
+        '''
+        queries = list(queries)
+        if self.response_cache is None:
+            keys, responses = list(range(len(queries))), {}
+        else:
+            keys = [self._cache_key(query, role, sub_role, model) for query in queries]
+            responses = self.response_cache.get_many(keys)
+        misses = {}
+        for key, query in zip(keys, queries):
+            if key not in responses:
+                misses.setdefault(key, query)
+        if misses:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            async with AsyncOpenAI(base_url=self.base_url, max_retries=0) as client:   # 재시도는 직접 처리
+                results = await asyncio.gather(*(self._acall(client, semaphore, query, role, sub_role, model) for query in misses.values()))
+            new_responses = dict(zip(misses.keys(), results))
+            if self.response_cache is not None:
+                self.response_cache.put_many({key: response for key, response in new_responses.items() if self._is_cacheable(response)}, model=model)
+            responses.update(new_responses)
+        return [responses[key] for key in keys]
+
+    def _backoff(self, attempt, error):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    async def _acall(self, client, semaphore, query, role, sub_role, model):
+        messages = [
+            {"role": "system", "content": role},
+            {"role": "system", "content": sub_role},
+            {"role": "user", "content": query},
+        ]
+        # 응답 전에는 실제 토큰 수를 알 수 없으므로 (문자 수 + max_tokens)로 넉넉하게 잡고, 응답 후 남는 만큼 돌려줌
+        estimated_tokens = sum(len(message['content']) for message in messages) + self.gen_config['max_tokens']
+        log = {'latency': None, 'prompt_tokens': 0, 'completion_tokens': 0, 'attempts': 0, 'error': None}
+        self.call_logs.append(log)
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                if self.request_bucket is not None:
+                    await self.request_bucket.acquire(1)
+                if self.token_bucket is not None:
+                    await self.token_bucket.acquire(estimated_tokens)
+                log['attempts'] += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=self.gen_config['max_tokens'],
+                        temperature=self.gen_config['temperature'],
+                    )
+                except (APIStatusError, APIConnectionError) as e:
+                    log['latency'] = time.perf_counter() - start
+                    if self.token_bucket is not None:
+                        self.token_bucket.refund(estimated_tokens)
+                    status_code = getattr(e, 'status_code', None)
+                    retryable = status_code is None or status_code == 429 or status_code >= 500
+                    if not retryable or attempt == self.max_retries:
+                        log['error'] = str(e)
+                        return f"Error: {str(e)}"
+                    await asyncio.sleep(self._backoff(attempt, e))
+                    continue
+                except Exception as e:
+                    log['error'] = str(e)
+                    return f"Error: {str(e)}"
+                log['latency'] = time.perf_counter() - start
+                if response.usage is not None:
+                    log['prompt_tokens'], log['completion_tokens'] = response.usage.prompt_tokens, response.usage.completion_tokens
+                    if self.token_bucket is not None:
+                        self.token_bucket.refund(max(0, estimated_tokens - response.usage.total_tokens))
+                return response.choices[0].message.content
+
+    def usage_summary(self):
+        '''
+        최근 call_log_size개 get_responses 호출 통계 (요청 수, 실패 수, 재시도 수, 토큰 사용량, latency p50/p99 초)
+        '''
+        latencies = [log['latency'] for log in self.call_logs if log['latency'] is not None]
+        return {
+            'calls': len(self.call_logs),
+            'errors': sum(log['error'] is not None for log in self.call_logs),
+            'retries': sum(max(0, log['attempts'] - 1) for log in self.call_logs),
+            'prompt_tokens': sum(log['prompt_tokens'] for log in self.call_logs),
+            'completion_tokens': sum(log['completion_tokens'] for log in self.call_logs),
+            'latency_p50': float(np.percentile(latencies, 50)) if latencies else None,
+            'latency_p99': float(np.percentile(latencies, 99)) if latencies else None,
+        }
 
     def set_prompt_template(self, query, context):
         self.rag_prompt_template = """
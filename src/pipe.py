@@ -1,16 +1,21 @@
-from .preprocessor import DataProcessor, TextProcessor, VecProcessor, TimeProcessor
-from .encoder import KFDeBERTaTokenizer, KFDeBERTa, ModelTrainer, ModelPredictor
-from .database import PostgresDB, DBConnection, TableEditor
-from .llm import LLMOpenAI
-from datasets import Dataset, DatasetDict
+from .preprocessor import DataProcessor, TextProcessor, VecProcessor, TimeProcessor, TickerMatcher, QueryFeatureExtractor
+from .database import PostgresDB, DBConnection, DBConnectionPool, TableEditor
+from .cache import ClassificationCache, LLMResponseCache, file_fingerprint, text_hash
 from dotenv import load_dotenv
+from contextlib import contextmanager
 from tqdm import tqdm
 import pandas as pd
 import time
 import json
+import codecs
 import os
 import requests
 import logging
+import multiprocessing
+import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timezone, timedelta
 
 
@@ -23,9 +28,13 @@ class EnvManager:
         if not self.openai_api_key:
             raise ValueError("OpenAI API 키가 로드되지 않았습니다.")
         
-        self.tickle_list = self.__load_tickle_list()
+        self.tickle_matcher = TickerMatcher.load(os.path.join('./', 'tickle', 'tickle-final.csv'))   # 종목 포함 여부/위치 탐색용
         self.model_config, self.db_config = self.__load_configs()
         self.conv_tb_name, self.cls_tb_name, self.clicked_tb_name = 'ibk_convlog', 'ibk_stock_cls', 'ibk_clicked_tb'   
+        self.watermark_tb_name = 'ibk_ingest_watermark'
+        self.counter_tb_name = 'ibk_conv_id_counter'
+        self.cls_cache_tb_name = 'ibk_cls_cache'
+        self.ticker_tb_name = 'ibk_conv_ticker'
 
     def __load_configs(self):
         '''
@@ -38,16 +47,6 @@ class EnvManager:
             db_config = json.load(f)
         return llm_config, db_config
 
-    def __load_tickle_list(self):
-        '''
-        국내 증권 종목 & 해외 증권 종목 리스트를 로드합니다. 
-        returns:
-        list[str]: 증권 종목 이름, 코드 값
-        '''
-        tickles = pd.read_csv(os.path.join('./', 'tickle', 'tickle-final.csv'))
-        tickles.dropna(inplace=True)
-        return tickles['tickle'].values.tolist()
-
 class PreProcessor:
     def initialize_processor(self):
         return DataProcessor(), TextProcessor(), VecProcessor(), TimeProcessor()
@@ -57,28 +56,81 @@ class DBManager:
         self.db_config = db_config
 
     def initialize_database(self):
-        db_connection = DBConnection(self.db_config)
+        '''
+        프로세스 공용 커넥션 풀에서 커넥션을 빌려 DB 인스턴스를 생성합니다. 
+        db_config에 use_pool: false를 지정하면 기존처럼 단독 커넥션을 사용합니다.
+        '''
+        pool = DBConnectionPool.get_pool(self.db_config) if self.db_config.get('use_pool', True) else None
+        db_connection = DBConnection(self.db_config, pool=pool)
         db_connection.connect()
         postgres = PostgresDB(db_connection)
         table_editor = TableEditor(db_connection)
         return postgres, table_editor
 
+    @contextmanager
+    def unit_of_work(self):
+        '''
+        작업 단위(상주 실행의 트리거 한 번) 동안 사용할 DB 인스턴스를 생성합니다. 
+        정상 종료 시 커밋, 예외 발생 시 롤백 후 커넥션을 반납합니다. (풀 사용 시 DBConnectionPool.unit_of_work)
+        '''
+        if self.db_config.get('use_pool', True):
+            with DBConnectionPool.get_pool(self.db_config).unit_of_work() as db_connection:
+                yield PostgresDB(db_connection), TableEditor(db_connection)
+            return
+        postgres, table_editor = self.initialize_database()
+        try:
+            yield postgres, table_editor
+            postgres.db_connection.conn.commit()
+        except Exception:
+            postgres.db_connection.conn.rollback()
+            raise
+        finally:
+            postgres.db_connection.close()
+
 
 class APIPipeline:
-    def __init__(self, bearer_tok):
+    BASE_URL = "https://chat-api.ibks.onelineai.com/api/ibk_securities/admin/logs"
+
+    def __init__(self, bearer_tok, timeout=60, max_retries=3, backoff_factor=1.0, max_workers=4):
+        '''
+        args:
+        timeout (int): 요청별 타임아웃 (초)
+        max_retries (int): 429, 5xx 응답 및 연결 오류 시 재시도 횟수 (지수 backoff)
+        max_workers (int): 동시 요청 수 상한
+        '''
         self.bearer_tok = bearer_tok 
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.session = self.__create_session(max_retries, backoff_factor)
+
+    def __create_session(self, max_retries, backoff_factor):
+        '''
+        keep-alive 커넥션을 재사용하는 공용 세션을 생성합니다. 
+        '''
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Authorization": f"Bearer {self.bearer_tok}"})
+        return session
 
     def get_data_range(self, start_date, end_date, tenant_id='ibk'):
-        url = f"https://chat-api.ibks.onelineai.com/api/ibk_securities/admin/logs?tenant_id={tenant_id}"
-        # 다음 날을 to_date로 설정 (get_data_api.py와 동일한 방식)
-        request_url = f"{url}&from_date_utc={start_date}&to_date_utc={end_date}"
-        headers = {
-            "Authorization": f"Bearer {self.bearer_tok}"
-        }
+        '''
+        returns:
+        list[dict]: API 응답 레코드 (데이터가 없으면 빈 리스트), 요청 실패 시 None
+        '''
+        request_url = f"{self.BASE_URL}?tenant_id={tenant_id}&from_date_utc={start_date}&to_date_utc={end_date}"
         print(f"API 요청 URL: {request_url}")
         print(f"Bearer Token: {self.bearer_tok[:10]}..." if self.bearer_tok else "Bearer Token 없음")
         try:
-            response = requests.get(request_url, headers=headers)
+            response = self.session.get(request_url, timeout=self.timeout)
             print(f"API 응답 상태 코드: {response.status_code}")
             
             if response.status_code == 200:
@@ -87,89 +139,242 @@ class APIPipeline:
                 return data
             else:
                 print(f"API 요청 실패: {response.status_code} - {response.text}")
-                return []
+                return None    # 요청 실패는 None, 데이터 없음은 빈 리스트로 구분
                 
         except Exception as e:
             print(f"API 요청 중 오류 발생: {str(e)}")
-            return []
+            return None
     
+    def iter_data_range(self, start_date, end_date, tenant_id='ibk', chunk_size=1000):
+        '''
+        get_data_range와 같은 데이터를 응답 전체를 메모리에 올리지 않고 스트리밍으로 파싱해 chunk_size개씩 반환합니다.
+        요청 실패나 수신 도중 연결이 끊긴 경우 예외를 발생시켜, 일부만 받은 응답이 정상 종료로 처리되지 않도록 합니다.
+        (raises: requests.RequestException, ValueError)
+        '''
+        request_url = f"{self.BASE_URL}?tenant_id={tenant_id}&from_date_utc={start_date}&to_date_utc={end_date}"
+        print(f"API 스트리밍 요청 URL: {request_url}")
+        try:
+            with self.session.get(request_url, timeout=self.timeout, stream=True) as response:
+                print(f"API 응답 상태 코드: {response.status_code}")
+                if response.status_code != 200:
+                    raise requests.HTTPError(f"API 요청 실패: {response.status_code} - {response.text}", response=response)
+                chunk = []
+                for record in self.iter_json_array(response.iter_content(chunk_size=64 * 1024)):
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+        except requests.RequestException as e:
+            print(f"API 요청 중 오류 발생: {str(e)}")
+            raise
+
+    @staticmethod
+    def iter_json_array(byte_chunks):
+        '''
+        JSON 배열 응답을 바이트 chunk 단위로 읽으며 원소를 하나씩 반환합니다. 
+        파싱이 끝난 앞부분은 버퍼에서 제거하므로 메모리 사용량은 원소 하나 크기 + chunk 크기로 유지됩니다.
+        '''
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        buffer, started = '', False
+        for byte_chunk in byte_chunks:
+            buffer += text_decoder.decode(byte_chunk)
+            pos = 0
+            while True:
+                while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError("API 응답이 JSON 배열 형식이 아닙니다.")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break    # 원소가 아직 다 도착하지 않음
+                yield record
+                pos = end
+            buffer = buffer[pos:]
+        raise ValueError("API 응답이 완전한 JSON 배열이 아닙니다.")    # 닫는 ']' 없이 응답이 끝난 경우
+
     def get_data(self, date, tenant_id='ibk'):
-        url = f"https://chat-api.ibks.onelineai.com/api/ibk_securities/admin/logs?tenant_id={tenant_id}"
         # 다음 날을 to_date로 설정 (get_data_api.py와 동일한 방식)
-        from datetime import datetime, timedelta
         from_date = datetime.strptime(date, "%Y-%m-%d")
         end_date = from_date + timedelta(days=1)
-        request_url = f"{url}&from_date_utc={from_date}&to_date_utc={end_date}"
-        headers = {
-            "Authorization": f"Bearer {self.bearer_tok}"
-        }
-        print(f"API 요청 URL: {request_url}")
-        print(f"Bearer Token: {self.bearer_tok[:10]}..." if self.bearer_tok else "Bearer Token 없음")
-        try:
-            response = requests.get(request_url, headers=headers)
-            print(f"API 응답 상태 코드: {response.status_code}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                print(f"API 응답 데이터 타입: {type(data)}")
-                return data
-            else:
-                print(f"API 요청 실패: {response.status_code} - {response.text}")
-                return []
-        except Exception as e:
-            print(f"API 요청 중 오류 발생: {str(e)}")
-            return []
+        return self.get_data_range(from_date, end_date, tenant_id=tenant_id)
+
+    def iter_data(self, date, tenant_id='ibk', chunk_size=1000):
+        from_date = datetime.strptime(date, "%Y-%m-%d")
+        return self.iter_data_range(from_date, from_date + timedelta(days=1), tenant_id=tenant_id, chunk_size=chunk_size)
+
+    def run_concurrently(self, func, jobs, max_workers=None):
+        '''
+        func를 jobs(kwargs 목록)마다 스레드 풀에서 동시에 호출합니다. 
+        결과는 완료 순서와 관계없이 jobs 순서대로 반환합니다.
+        '''
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            futures = [executor.submit(func, **job) for job in jobs]
+            return [future.result() for future in futures]
+
+    def get_data_many(self, dates, tenant_ids, max_workers=None):
+        '''
+        여러 날짜와 tenant의 데이터를 동시에 가져옵니다. 
+        returns:
+        list[tuple]: (date, tenant_id, data) - 날짜, tenant 순서로 정렬
+        '''
+        jobs = [{"date": date, "tenant_id": tenant_id} for date in dates for tenant_id in tenant_ids]
+        results = self.run_concurrently(self.get_data, jobs, max_workers)
+        return [(job["date"], job["tenant_id"], data) for job, data in zip(jobs, results)]
     
-    def process_data(self, data):
+    def process_data(self, data, n_workers=1):
         '''
         api로 받은 데이터를 postgres db에 저장 가능한 형태로 변경  
         date, qa, content, user_id, tenant_id, hash_value, hash_ref: ibk, msty 
+        레코드를 컬럼 단위로 모아 Q/A 프레임을 만들고 해시값을 일괄 계산합니다. (n_workers > 1이면 프로세스 풀 사용)
         '''
+        columns = ["date", "q/a", "content", "user_id", "tenant_id", "hash_value", "hash_ref"]
         if not data:
             print("API에서 받은 데이터가 비어있습니다.")
-            return pd.DataFrame(columns=["date", "q/a", "content", "user_id", "tenant_id", "hash_value", "hash_ref"])
-            
-        import hashlib
-        records = []
-        for d in data:
-            if "Q" in d and "A" in d and "date" in d and "user_id" in d:
-                # user_id가 None인 경우 'UNKNOWN'으로 처리
-                user_id = d["user_id"] if d["user_id"] is not None and d["user_id"] != "" else "UNKNOWN"
-                tenant_id = d.get("tenant_id") if d.get("tenant_id") is not None else None
-                
-                # Q와 A의 해시값을 미리 생성 (user_id가 None이면 'UNKNOWN' 사용)
-                q_hash = hashlib.md5(f"{user_id}_{d['Q']}_{d['date']}".encode()).hexdigest()
-                a_hash = hashlib.md5(f"{user_id}_{d['A']}_{d['date']}".encode()).hexdigest()
-                
-                records.append({
-                    "date": d["date"], 
-                    "q/a": "Q", 
-                    "content": d["Q"], 
-                    "user_id": user_id,  # None이면 'UNKNOWN'으로 저장
-                    "tenant_id": tenant_id,
-                    "hash_value": q_hash,
-                    "hash_ref": None  # Q는 hash_ref가 NULL
-                })
-                records.append({
-                    "date": d["date"], 
-                    "q/a": "A", 
-                    "content": d["A"], 
-                    "user_id": user_id,  # None이면 'UNKNOWN'으로 저장
-                    "tenant_id": tenant_id,
-                    "hash_value": a_hash,
-                    "hash_ref": q_hash  # A는 Q의 hash_value를 hash_ref로
-                })
-            else:
-                print(f"데이터 구조가 예상과 다릅니다: {d.keys()}")
+            return pd.DataFrame(columns=columns)
+
+        records = [d for d in data if "Q" in d and "A" in d and "date" in d and "user_id" in d]
+        if len(records) < len(data):
+            for d in data:
+                if not ("Q" in d and "A" in d and "date" in d and "user_id" in d):
+                    print(f"데이터 구조가 예상과 다릅니다: {d.keys()}")
         if not records:
             print("처리 가능한 레코드가 없습니다.")
-            return pd.DataFrame(columns=["date", "q/a", "content", "user_id", "tenant_id", "hash_value", "hash_ref"])
-            
-        input_data = pd.DataFrame(records, columns=["date", "q/a", "content", "user_id", "tenant_id", "hash_value", "hash_ref"])
+            return pd.DataFrame(columns=columns)
+
+        # 원본 값의 타입이 바뀌지 않도록 object 타입으로 컬럼 구성
+        raw = pd.DataFrame({
+            "date": pd.Series([d["date"] for d in records], dtype=object),
+            "Q": pd.Series([d["Q"] for d in records], dtype=object),
+            "A": pd.Series([d["A"] for d in records], dtype=object),
+            "user_id": pd.Series([d["user_id"] for d in records], dtype=object),
+            "tenant_id": pd.Series([d.get("tenant_id") for d in records], dtype=object),
+        })
+        # user_id가 None이거나 빈 문자열인 경우 'UNKNOWN'으로 처리
+        raw["user_id"] = raw["user_id"].where(raw["user_id"].notna() & (raw["user_id"] != ""), "UNKNOWN")
+
+        # Q와 A의 해시값을 한 번에 생성
+        data_processor = DataProcessor()
+        hashes = data_processor.hash_values(
+            pd.concat([raw["user_id"], raw["user_id"]]), pd.concat([raw["Q"], raw["A"]]), pd.concat([raw["date"], raw["date"]]),
+            n_workers=n_workers
+        )
+        q_hash, a_hash = hashes[:len(raw)], hashes[len(raw):]
+
+        q_frame = pd.DataFrame({"date": raw["date"], "q/a": "Q", "content": raw["Q"], "user_id": raw["user_id"],
+                                "tenant_id": raw["tenant_id"], "hash_value": q_hash, "hash_ref": None})    # Q는 hash_ref가 NULL
+        a_frame = pd.DataFrame({"date": raw["date"], "q/a": "A", "content": raw["A"], "user_id": raw["user_id"],
+                                "tenant_id": raw["tenant_id"], "hash_value": a_hash, "hash_ref": q_hash})    # A는 Q의 hash_value를 hash_ref로
+        # Q1, A1, Q2, A2 ... 순서로 병합
+        input_data = pd.concat([q_frame, a_frame]).sort_index(kind="stable").reset_index(drop=True)[columns]
+        input_data["hash_ref"] = input_data["hash_ref"].astype(object).where(input_data["hash_ref"].notna(), None)
         print(f"처리된 레코드 수: {len(input_data)}")
         return input_data
 
 
+class WatermarkManager:
+    '''
+    tenant별 수집 워터마크(마지막으로 저장한 date)를 관리합니다.
+    스케줄링 모드에서 당일 전체 데이터를 매번 다시 받지 않고, 워터마크 - overlap_minutes 이후의 데이터만 API로 요청합니다.
+    '''
+    def __init__(self, postgres, table_editor, table_name, overlap_minutes=10):
+        self.postgres = postgres
+        self.table_editor = table_editor
+        self.table_name = table_name
+        self.overlap = timedelta(minutes=overlap_minutes)
+        self.pending = {}
+        self.table_editor.create_watermark_table(self.table_name)
+
+    @staticmethod
+    def to_utc(date_str):
+        '''
+        API date 문자열을 UTC datetime으로 변환합니다. (timezone 정보가 없으면 UTC로 간주)
+        '''
+        date_value = datetime.fromisoformat(date_str)
+        if date_value.tzinfo is None:
+            date_value = date_value.replace(tzinfo=timezone.utc)
+        return date_value.astimezone(timezone.utc)
+
+    def build_jobs(self, tenant_ids, date):
+        '''
+        tenant별 API 요청 범위를 만듭니다. 워터마크가 있으면 워터마크 - overlap 부터 현재까지, 없으면 date 하루치입니다.
+
+        returns:
+        list[dict]: get_data_range 인자 (start_date, end_date, tenant_id)
+        '''
+        logger = logging.getLogger(__name__)
+        end = (datetime.now(timezone.utc) + timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M:%S")
+        day_start = datetime.strptime(date, "%Y-%m-%d")
+        jobs = []
+        for tenant_id in tenant_ids:    # 워터마크 조회는 DB 커서를 공유하므로 순차적으로 수행
+            watermark = self.postgres.get_watermark(self.table_name, tenant_id)
+            if watermark is None:
+                jobs.append({"start_date": day_start, "end_date": day_start + timedelta(days=1), "tenant_id": tenant_id})    # get_data와 동일
+            else:
+                start = (watermark.astimezone(timezone.utc) - self.overlap).strftime("%Y-%m-%d %H:%M:%S")
+                logger.info(f"   ⏱️ {tenant_id} 워터마크 기준 수집: {start} ~ {end} (UTC)")
+                jobs.append({"start_date": start, "end_date": end, "tenant_id": tenant_id})
+        return jobs
+
+    def observe(self, tenant_id, api_data):
+        '''
+        가져온 데이터의 최대 date를 commit 전까지 pending에 보관합니다.
+        '''
+        dates = [self.to_utc(d['date']) for d in api_data or [] if d.get('date')]
+        if dates:
+            self.pending[tenant_id] = max(dates + [self.pending.get(tenant_id, dates[0])])
+
+    def fetch_many(self, api_pipeline, tenant_ids, date, max_workers=None):
+        '''
+        build_jobs 범위의 데이터를 tenant별로 동시에 가져옵니다.
+
+        returns:
+        list[tuple]: (tenant_id, data) - tenant_ids 순서
+        '''
+        jobs = self.build_jobs(tenant_ids, date)
+        results = api_pipeline.run_concurrently(api_pipeline.get_data_range, jobs, max_workers)
+        for tenant_id, api_data in zip(tenant_ids, results):
+            self.observe(tenant_id, api_data)
+        return list(zip(tenant_ids, results))
+
+    def iter_chunks(self, api_pipeline, tenant_ids, date, chunk_size=1000):
+        '''
+        build_jobs 범위의 데이터를 tenant 순서대로 스트리밍하며 chunk_size개씩 반환합니다.
+        '''
+        for job in self.build_jobs(tenant_ids, date):
+            for chunk in api_pipeline.iter_data_range(chunk_size=chunk_size, **job):
+                self.observe(job["tenant_id"], chunk)
+                yield job["tenant_id"], chunk
+
+    def fetch(self, api_pipeline, tenant_id, date):
+        return self.fetch_many(api_pipeline, [tenant_id], date)[0][1]
+
+    def commit(self):
+        '''
+        데이터 저장이 끝난 후 pending 워터마크를 데이터베이스에 반영합니다.
+        '''
+        for tenant_id, last_date in self.pending.items():
+            self.table_editor.update_watermark(self.table_name, tenant_id, last_date)
+        self.pending = {}
+
+    def discard(self):
+        '''
+        수집 또는 저장에 실패한 경우 pending 워터마크를 반영하지 않고 버립니다. (다음 실행에서 같은 범위를 다시 요청)
+        '''
+        self.pending = {}
+
+
 class ModelManager:
     def __init__(self, model_config):
         self.model_config = model_config
@@ -177,9 +382,14 @@ class ModelManager:
     def set_cls_trainset(self, dataset, dataset2, data_processor):
         '''
         db에서 입력받은 데이터를 학습 데이터세트로 변환합니다. 
+        dataset, dataset2는 테이블 전체 행(list[tuple]) 또는 필요한 컬럼만 조회한 pd.DataFrame 입니다.
+        (DataFrame: convlog [conv_id, qa, content], cls [conv_id, ensemble])
         '''
-        convlog_data = data_processor.data_to_df(dataset, columns=['conv_id', 'date', 'qa', 'content', 'userid'])
-        cls_data = data_processor.data_to_df(dataset2, columns=['conv_id', 'ensemble', 'gpt', 'encoder']) 
+        from datasets import Dataset, DatasetDict
+        convlog_data = dataset if isinstance(dataset, pd.DataFrame) else \
+            data_processor.data_to_df(dataset, columns=['conv_id', 'date', 'qa', 'content', 'userid'])
+        cls_data = dataset2 if isinstance(dataset2, pd.DataFrame) else \
+            data_processor.data_to_df(dataset2, columns=['conv_id', 'ensemble', 'gpt', 'encoder']) 
         convlog_q = data_processor.filter_data(convlog_data, 'qa', 'Q')
         convlog_trainset = data_processor.merge_data(convlog_q, cls_data, on='conv_id')
         convlog_trainset['label'] = convlog_trainset['ensemble'].apply(lambda x: 'stock' if x == 'o' else 'nstock')
@@ -201,15 +411,18 @@ class ModelManager:
         '''
         토큰 개수 검사 토크나이저를 로드합니다. 
         '''
+        from .encoder import KFDeBERTaTokenizer
         return KFDeBERTaTokenizer(val_tok_path)
     
     def set_encoder(self, model_path):
+        from .encoder import KFDeBERTaTokenizer, KFDeBERTa
         return KFDeBERTaTokenizer(model_path), KFDeBERTa(model_path)
         
     def initialize_trainer(self, model_path, model_config, dataset):
         '''
         증권 종목 예측에 사용되는 인코더 모델을 로드합니다. 
         '''
+        from .encoder import KFDeBERTaTokenizer, KFDeBERTa, ModelTrainer
         tokenizer = KFDeBERTaTokenizer(model_path).tokenizer
         kfdeberta = KFDeBERTa(model_path)
         model = kfdeberta.model
@@ -219,9 +432,50 @@ class ModelManager:
         trainer.setup_trainer(dataset)
         return trainer
 
-    def initialize_predictor(self, model_path):
+    def export_onnx(self, model_path, quantize=False):
+        '''
+        model_path의 인코더 모델을 ONNX로 저장합니다. (model.onnx, quantize=True면 model.int8.onnx 추가)
+        returns:
+        str: 추론에 사용할 ONNX 파일 경로
+        '''
+        from .encoder import KFDeBERTaTokenizer, KFDeBERTa
         tokenizer = KFDeBERTaTokenizer(model_path).tokenizer
-        model = KFDeBERTa(model_path).model
+        kfdeberta = KFDeBERTa(model_path)
+        onnx_path = kfdeberta.export_onnx(os.path.join(model_path, 'model.onnx'), tokenizer)
+        if quantize:
+            onnx_path = kfdeberta.quantize_onnx(onnx_path, os.path.join(model_path, 'model.int8.onnx'))
+        return onnx_path
+
+    def _is_onnx_stale(self, model_path, onnx_path):
+        '''
+        ONNX 파일이 없거나, model_path의 가중치가 ONNX 파일보다 나중에 저장된 경우 True를 반환합니다.
+        '''
+        if not os.path.exists(onnx_path):
+            return True
+        weights = [os.path.join(model_path, name) for name in os.listdir(model_path) if name.endswith(('.safetensors', '.bin'))]
+        return any(os.path.getmtime(weight) > os.path.getmtime(onnx_path) for weight in weights)
+
+    def initialize_predictor(self, model_path, backend=None):
+        '''
+        증권 종목 분류 predictor를 생성합니다. 
+        backend (기본값: model_config['backend'] 또는 torch)
+        - torch: transformers 모델로 추론
+        - onnx: ONNX Runtime(CPU)으로 추론. model_config['onnx_quantize']가 true면 INT8 양자화 모델을 사용합니다.
+                ONNX 파일이 없거나 model-update 가중치보다 오래된 경우 다시 내보냅니다.
+        '''
+        from .encoder import KFDeBERTaTokenizer, KFDeBERTa, ModelPredictor, ONNXModel
+        backend = backend or self.model_config.get('backend', 'torch')
+        tokenizer = KFDeBERTaTokenizer(model_path).tokenizer
+        if backend == 'onnx':
+            quantize = self.model_config.get('onnx_quantize', False)
+            onnx_path = os.path.join(model_path, 'model.int8.onnx' if quantize else 'model.onnx')
+            if self._is_onnx_stale(model_path, onnx_path):
+                self.export_onnx(model_path, quantize=quantize)
+            model = ONNXModel(onnx_path, num_threads=self.model_config.get('onnx_threads'))
+        elif backend == 'torch':
+            model = KFDeBERTa(model_path).model
+        else:
+            raise ValueError(f"지원하지 않는 backend입니다: {backend}")
         return ModelPredictor(tokenizer=tokenizer, model=model)
 
 
@@ -232,9 +486,17 @@ class LLMManager:
     def initialize_openai_llm(self):
         '''
         ChatGPT 인스턴스를 생성하고 반환합니다. 
+        model_config의 llm_cache(기본값: true)가 true면 응답을 SQLite 파일(llm_cache_path)에 캐시합니다.
         '''
+        from .llm import LLMOpenAI
         openai_llm = LLMOpenAI(self.model_config)
         openai_llm.set_generation_config()
+        if self.model_config.get('llm_cache', True):
+            openai_llm.set_response_cache(LLMResponseCache(
+                self.model_config.get('llm_cache_path', os.path.join('./', 'cache', 'llm_responses.sqlite3')),
+                ttl_hours=self.model_config.get('llm_cache_ttl_hours', 168),
+                max_entries=self.model_config.get('llm_cache_size', 100000)
+            ))
         return openai_llm
         
 
@@ -245,54 +507,236 @@ class PipelineController:
         self.preprocessor = preprocessor 
         self.model_manager = model_manager 
         self.llm_manager = llm_manager 
+        self.cls_cache = None
+        self.postgres, self.table_editor = None, None
+        self.in_unit_of_work = False
+        self.model_version, self.tickle_version = None, None
     
     def set_env(self):
-        self.tickle_list = self.env_manager.tickle_list 
-        self.postgres, self.table_editor = self.db_manager.initialize_database()
+        self.tickle_matcher = self.env_manager.tickle_matcher
+        self.acquire_connection()
         self.data_p, self.text_p, self.vec_p, self.time_p = self.preprocessor.initialize_processor()
         # print(self.model_manager)
         if self.model_manager != None:
             self.val_tokenizer = self.model_manager.set_val_tokenizer(os.path.join(self.env_manager.model_config['model_path'], 'val-tokenizer'))
-            self.predictor = self.model_manager.initialize_predictor(os.path.join(self.env_manager.model_config['model_path'], 'kfdeberta', 'model-update'))
+            self.predictor = self.model_manager.initialize_predictor(self.model_path)
+            # onnx backend는 model-update 폴더에 파일을 내보내므로 predictor 생성 이후의 상태를 기준 버전으로 기록
+            self.model_version, self.tickle_version = file_fingerprint(self.model_path), file_fingerprint(self.tickle_path)
             self.openai_llm = self.llm_manager.initialize_openai_llm()
+            self.cls_cache = self.set_cls_cache()
+            self.query_features = QueryFeatureExtractor(self.tickle_matcher, self.val_tokenizer)
+            self.table_editor.create_ticker_table(self.env_manager.ticker_tb_name)
 
-    def process_data(self, input_data):
+    @property
+    def model_path(self):
+        return os.path.join(self.env_manager.model_config['model_path'], 'kfdeberta', 'model-update')
+
+    @property
+    def tickle_path(self):
+        return os.path.join('./', 'tickle', 'tickle-final.csv')
+
+    def _use_connection(self, postgres, table_editor):
+        self.postgres, self.table_editor = postgres, table_editor
+        if self.cls_cache is not None:
+            self.cls_cache.postgres, self.cls_cache.table_editor = self.postgres, self.table_editor
+
+    def acquire_connection(self):
+        '''
+        커넥션 풀에서 새 커넥션을 받아 postgres, table_editor(분류 캐시 포함)를 교체합니다.
+        실행이 끝나면 release_connection으로 반납합니다.
+        '''
+        self.release_connection()
+        self._use_connection(*self.db_manager.initialize_database())
+        return self.postgres, self.table_editor
+
+    def release_connection(self):
+        '''
+        사용 중인 커넥션을 풀에 반납합니다. (unit_of_work 안에서는 블록이 끝날 때 반납)
+        '''
+        if self.in_unit_of_work:
+            return
+        if self.postgres is not None:
+            self.postgres.db_connection.close()
+        self.postgres, self.table_editor = None, None
+
+    @contextmanager
+    def unit_of_work(self):
+        '''
+        상주 실행 시 트리거마다 사용합니다. 작업 단위 커넥션을 받아 postgres, table_editor(분류 캐시 포함)를 교체하고,
+        블록이 끝나면 커밋(예외 시 롤백) 후 반납합니다. (DBManager.unit_of_work)
+        ex) with pipe.unit_of_work(): pipe.refresh_model(); pipe.run(...)
+        '''
+        self.release_connection()
+        with self.db_manager.unit_of_work() as (postgres, table_editor):
+            self._use_connection(postgres, table_editor)
+            self.in_unit_of_work = True
+            try:
+                yield postgres, table_editor
+            finally:
+                self.in_unit_of_work = False
+                self.postgres, self.table_editor = None, None
+
+    def refresh_model(self):
+        '''
+        model-update 가중치 또는 tickle 파일이 바뀐 경우에만 predictor, 종목 매처를 다시 로드합니다.
+        (파일 이름, 크기, 수정 시각 기준)
+
+        returns:
+        bool: 다시 로드했는지 여부
+        '''
+        if self.model_manager is None:
+            return False
+        logger = logging.getLogger(__name__)
+        reloaded = False
+        if file_fingerprint(self.model_path) != self.model_version:
+            logger.info("🔄 model-update 가중치 변경 감지 - predictor를 다시 로드합니다.")
+            self.predictor = self.model_manager.initialize_predictor(self.model_path)
+            self.model_version = file_fingerprint(self.model_path)
+            reloaded = True
+        if file_fingerprint(self.tickle_path) != self.tickle_version:
+            logger.info("🔄 tickle 파일 변경 감지 - 종목 매처를 다시 로드합니다.")
+            self.tickle_matcher = self.env_manager.tickle_matcher = TickerMatcher.load(self.tickle_path)
+            self.query_features = QueryFeatureExtractor(self.tickle_matcher, self.val_tokenizer)
+            self.tickle_version = file_fingerprint(self.tickle_path)
+            reloaded = True
+        if reloaded and self.cls_cache is not None:
+            self.cls_cache.set_model_version(file_fingerprint(self.model_path, self.tickle_path))
+            logger.info(f"🧹 이전 모델 버전의 분류 캐시 {self.cls_cache.purge_stale()}건을 삭제했습니다.")
+        return reloaded
+
+    def set_cls_cache(self):
+        '''
+        분류 결과 캐시를 생성합니다. 모델 가중치(model-update)와 tickle 파일이 바뀌면 model_version이 바뀌어 이전 결과는 사용하지 않습니다.
+        model_config의 cls_cache(기본값: true)가 false면 캐시를 사용하지 않습니다.
+        '''
+        if not self.env_manager.model_config.get('cls_cache', True):
+            return None
+        model_version = file_fingerprint(self.model_path, self.tickle_path)
+        return ClassificationCache(self.postgres, self.table_editor, self.env_manager.cls_cache_tb_name, model_version,
+                                   maxsize=self.env_manager.model_config.get('cls_cache_size', 100000))
+
+    def drop_duplicate_hashes(self, input_data):
+        '''
+        이미 데이터베이스에 저장된 hash_value, 또는 배치 안에서 앞서 등장한 hash_value를 가진 행을 제외합니다.
+        returns:
+        pd.DataFrame: 신규 데이터 
+        int: 제외된 중복 데이터 수
+        '''
+        logger = logging.getLogger(__name__)
+        existing_hashes = self.postgres.find_duplicate_hashes(self.env_manager.conv_tb_name, input_data['hash_value'])
+        duplicated = input_data['hash_value'].isin(existing_hashes) | input_data['hash_value'].duplicated()
+        if duplicated.any():
+            logger.info(f"이미 존재하는 데이터 {int(duplicated.sum())}개 제외 (해시: {', '.join(h[:8] for h in input_data['hash_value'][duplicated][:5])}...)")
+        return input_data[~duplicated].reset_index(drop=True), int(duplicated.sum())
+
+    def assign_conv_ids(self, input_data):
+        '''
+        API 데이터의 date(UTC)를 KST로 변환하고, KST 날짜별 일련번호로 conv_id(20240130_00001)를 부여합니다.
+        일련번호는 날짜별 카운터 테이블에서 원자적으로 예약한 블록 안에서 입력 순서대로 매깁니다.
+        args:
+        input_data (pd.DataFrame): APIPipeline.process_data 결과
+
+        returns:
+        pd.DataFrame: [conv_id, date, q/a, content, user_id, tenant_id, hash_value, hash_ref]
+        '''
+        input_data = input_data.reset_index(drop=True).copy()
+        kst_dates = self.time_p.utc_to_kst(input_data['date'])
+        pk_dates = kst_dates.dt.strftime('%Y%m%d')
+        self.table_editor.create_conv_id_counter_table(self.env_manager.counter_tb_name)
+        date_counters = self.postgres.allocate_conv_seq(self.env_manager.counter_tb_name, self.env_manager.conv_tb_name,
+                                                        pk_dates.value_counts().to_dict())
+        seqs = pk_dates.map(date_counters) + input_data.groupby(pk_dates).cumcount() + 1
+
+        input_data['date'] = kst_dates.map(pd.Timestamp.isoformat)
+        input_data.insert(0, 'conv_id', pk_dates + '_' + seqs.astype(str).str.zfill(5))
+        return input_data[['conv_id', 'date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']]
+
+    def classify_queries(self, queries):
+        '''
+        질문 목록을 분류합니다. 정규화한 텍스트가 같은 질문은 한 번만 분류하고, 분류 결과 캐시에 있는 질문은 모델 추론을 건너뜁니다.
+        사용자 질문이 단일 토큰으로 이루어진 경우, tickle list와 매핑해 tickle 관련 질문인지 추가 검사한다.
+
+        returns:
+        dict: {text_hash: (enc_res, probabilities)}
+        '''
+        unique_queries = {}
+        for query in queries:
+            unique_queries.setdefault(text_hash(query), query)
+        classified = self.cls_cache.get_many(unique_queries.values()) if self.cls_cache is not None else {}
+        misses = [(key, query) for key, query in unique_queries.items() if key not in classified]
+        if self.cls_cache is not None:
+            print(f'분류 캐시: 적중 {len(classified)}개, 추론 {len(misses)}개')
+        if not misses:
+            return classified
+
+        batch_size = self.env_manager.model_config.get('batch_size', 32)
+        labels, probas = self.predictor.predict_batch([query for _, query in misses], batch_size=batch_size)
+        features = self.query_features.extract([query for _, query in misses], find_tickers=False)
+        new_results = {}
+        for (key, _), label, proba, feature in zip(misses, labels, probas, features):
+            enc_res = 'o' if label == 'stock' else 'x'
+            if feature['single_token']:
+                enc_res = 'o' if feature['ticker_hit'] else 'x'    # 불필요한 단어 제거 후 종목 매핑
+            new_results[key] = (enc_res, proba)
+        if self.cls_cache is not None:
+            self.cls_cache.put_many(new_results)
+        classified.update(new_results)
+        return classified
+
+    def process_data(self, input_data, relabel=False):
         '''
         대화 기록을 보고, 해당 대화가 증권 종목 분석 질문인지 아닌지 분류한 후 PostgreSQL 데이터베이스에 저장합니다.  
         증권 종목 분석 질문이거나, 사용자가 앱 내 버튼을 클릭해서 대화를 시작한 경우, 증권 종목 이름을 추출합니다 (향후 구현)
         args:
         input_data (db table): ibk 투자 증권 챗봇을 이용한 사용자들의 대화 로그 [conv_id (pk), date, qa, content, user id]
+        relabel (bool): True면 이미 분류된 질문도 다시 분류해 결과를 갱신합니다. (모델 업데이트 후 재분류)
         
         process:
-        Step 1. qa 타입이 'a' (챗봇의 응답) 이거나 이미 데이터베이스에 존재하는 데이터인지 체크한다. 
-        Step 2. 그 이외의 경우, 사용자 질문에 대해 encoder 모델, gpt 모델을 활용해 증권 종목 질문 여부를 분류한다. 
+        Step 1. qa 타입이 'a' (챗봇의 응답) 이거나 이미 데이터베이스에 존재하는 데이터인지 체크한다. (분류된 conv_id는 일괄 조회)
+        Step 2. 그 이외의 경우, 사용자 질문들을 모아 encoder 모델로 배치 단위 분류한다. (batch_size: model_config['batch_size'])
+                같은 질문은 한 번만 분류하고, 분류 결과 캐시에 있는 질문은 추론을 건너뛴다. (classify_queries)
           Step 2.1. 성능 개선을 위해, 사용자 질문이 단일 토큰으로 이루어진 경우, tickle list와 매핑해 tickle 관련 질문인지 추가 검사한다.
         Step 3. 사용자가 앱 내 버튼을 클릭한 후 질문을 할 경우, (KR: 333333) 같은 표현값이 대화 기록에 남는다. 이를 활용해 사용자가 
                 버튼을 클릭해 들어온 사용자인지 아닌지 분류한다.
-        Step 4. 생성한 데이터세트를 PostgreSQL 각 테이블에 저장한다.
-        '''
-        for idx in tqdm(range(len(input_data))):    
-            if input_data[idx][2] == 'A':
-                continue
-            if self.postgres.check_pk(self.env_manager.cls_tb_name, input_data[idx][0]):    # 데이터베이스에 이미 존재하는 데이터인 경우
-                continue
-
-            query = input_data[idx][3]
-            print(f'query: {query}')
-            encoder_response = self.predictor.predict(query)
-            enc_res = 'o' if encoder_response == 'stock' else 'x'
-
-            if len(self.val_tokenizer.tokenize_data(query)) == 1:
-                cleaned_word = self.text_p.remove_patterns(query, r"(뉴스|주식|정보|분석)$")    # 불필요한 단어 제거
-                enc_res = 'o' if cleaned_word in self.tickle_list else 'x'
-            cls_pred_set = (input_data[idx][0], enc_res)  
-            TICKLE_PATTERN = r"\b\w+\(KR:\d+\)"
-            clicked = 'o' if self.text_p.check_expr(TICKLE_PATTERN, query) else 'x'
-            u_id = input_data[idx][4]
-            clicked_set = (input_data[idx][0], clicked, u_id)
-
-            self.table_editor.edit_cls_table('insert', self.env_manager.cls_tb_name, data_type='raw', data=cls_pred_set)
-            self.table_editor.edit_clicked_table('insert', self.env_manager.clicked_tb_name, data_type='raw', data=clicked_set)
+        Step 4. 모든 사용자 질문에서 언급된 증권 종목을 추출한다. (TickerMatcher)
+        Step 5. 생성한 데이터세트를 PostgreSQL 각 테이블에 일괄 저장한다. (언급 종목: ticker_tb_name)
+
+        returns:
+        list[tuple]: 분류 결과 (conv_id, enc_res, probabilities, tickers)
+        '''
+        # 이미 분류된 conv_id를 한 번의 쿼리로 미리 조회
+        classified_ids = set() if relabel else \
+            self.postgres.get_existing_pks(self.env_manager.cls_tb_name, [row[0] for row in input_data if row[2] != 'A'])
+        questions = [row for row in input_data if row[2] != 'A' and row[0] not in classified_ids]
+        if not questions:
+            print('분류할 신규 질문이 없습니다.')
+            return []
+
+        print(f'분류할 질문 수: {len(questions)}')
+        queries = [row[3] for row in questions]
+        classified = self.classify_queries(queries)
+        features = self.query_features.extract(queries, count_tokens=False)    # 클릭 여부, 언급 종목
+
+        results, cls_pred_sets, clicked_sets, ticker_sets = [], [], [], []
+        for row, query, feature in zip(questions, queries, features):
+            enc_res, proba = classified[text_hash(query)]
+            clicked = 'o' if feature['clicked'] else 'x'
+            cls_pred_sets.append((row[0], enc_res))
+            clicked_sets.append((row[0], clicked, row[4]))
+            ticker_sets.append((row[0], feature['tickers']))
+            results.append((row[0], enc_res, proba, feature['tickers']))
+
+        # 겹쳐 실행된 작업이 먼저 저장한 conv_id는 ON CONFLICT로 건너뜀
+        if relabel:
+            inserted, skipped = self.table_editor.upsert(self.env_manager.cls_tb_name, TableEditor.CLS_COLUMNS, cls_pred_sets,
+                                                         conflict_columns=['conv_id'], update_columns=['ensemble'])
+        else:
+            inserted, skipped = self.table_editor.edit_cls_table('insert', self.env_manager.cls_tb_name, data_type='upsert', data=cls_pred_sets)
+        self.table_editor.edit_clicked_table('insert', self.env_manager.clicked_tb_name, data_type='upsert', data=clicked_sets)
+        self.table_editor.upsert(self.env_manager.ticker_tb_name, TableEditor.TICKER_COLUMNS, ticker_sets, conflict_columns=['conv_id'],
+                                 update_columns=['tickers'] if relabel else None)
+        print(f'분류 결과 저장: 신규 {inserted}개, 이미 존재 {skipped}개 (종목 언급 질문 {sum(1 for _, tickers in ticker_sets if tickers)}개)')
+        return results
 
     def run(self, process='daily', query=None):
         '''
@@ -300,18 +744,173 @@ class PipelineController:
         '''
         if query:
             self.openai_llm.set_stock_guideline()
-            if len(self.val_tokenizer.tokenize_data(query)) == 1:
-                cleaned_word = self.text_p.remove_patterns(query, r"(뉴스|주식|정보|분석)$")    # 불필요한 단어 제거
-                ensembled_res = 'o' if cleaned_word in self.tickle_list else 'x'
+            feature = self.query_features.extract([query])[0]
+            if feature['single_token']:
+                ensembled_res = 'o' if feature['ticker_hit'] else 'x'    # 불필요한 단어 제거 후 종목 매핑
                 print(f'해당 쿼리는 종목 분석 {ensembled_res} 질문입니다.')
+            print(f"언급된 종목: {', '.join(feature['tickers']) if feature['tickers'] else '없음'}")
             response = self.openai_llm.get_response(query=query, role=self.openai_llm.system_role, sub_role=self.openai_llm.stock_role)
             print(f'해당 쿼리는 {response} 질문입니다.')
         else:
             yy, mm, dd = self.time_p.get_current_date()
             crawling_date = yy + mm + dd    # 20240201 형식
-            input_data = self.postgres.get_total_data(self.env_manager.conv_tb_name) if process == 'code-test' else \
-                self.postgres.get_day_data(self.env_manager.conv_tb_name, crawling_date)
-            self.process_data(input_data)
+            if process == 'code-test':
+                # 전체 재분류는 서버 측 커서로 chunk 단위 처리 (메모리 사용량 일정)
+                for input_data in self.postgres.iter_total_data(self.env_manager.conv_tb_name, columns=TableEditor.CONV_COLUMNS[:5]):
+                    self.process_data(input_data)
+            else:
+                input_data = self.postgres.get_day_data(self.env_manager.conv_tb_name, crawling_date)
+                self.process_data(input_data)
+
+
+class ClassificationWorker:
+    '''
+    스케줄러에 상주하는 분류 작업자: predictor, 검증용 tokenizer, 종목 매처, 분류 캐시를 한 번만 로드해 두고 트리거마다 재사용합니다.
+    DB 커넥션은 실행마다 풀에서 받아 반납하고, model-update 가중치나 tickle 파일이 바뀐 경우에만 다시 로드합니다.
+    '''
+    def __init__(self, args):
+        self.args = args
+        self.env_manager = EnvManager(args)
+        self.pipe = PipelineController(env_manager=self.env_manager, preprocessor=PreProcessor(), db_manager=DBManager(self.env_manager.db_config),
+                                       model_manager=ModelManager(self.env_manager.model_config), llm_manager=LLMManager(self.env_manager.model_config))
+        try:
+            self.pipe.set_env()
+        finally:
+            self.pipe.release_connection()   # 로드에 실패해도 커넥션은 풀에 반납
+        self.n_runs = 0
+
+    def run_once(self, process=None, query=None):
+        logger = logging.getLogger(__name__)
+        start = time.time()
+        with self.pipe.unit_of_work():   # 실행마다 풀에서 커넥션을 받아 반납
+            self.pipe.refresh_model()
+            self.pipe.run(process=process or self.args.process, query=query or self.args.query)
+        self.n_runs += 1
+        logger.info(f"상주 분류 작업 {self.n_runs}회차 완료 ({time.time() - start:.1f}s)")
+
+
+def _reclassify_shard(args, shard_id, start_date, end_date, relabel, num_threads, itersize, progress_queue):
+    '''
+    ShardedReclassifier 작업 프로세스: predictor와 DB 커넥션을 한 번만 만들고, 담당 기간을 chunk 단위로 분류해 일괄 저장합니다.
+    chunk마다 (shard_id, 처리 행 수, 분류 질문 수, 경과 시간, 완료 여부)를 progress_queue로 보냅니다.
+    '''
+    import torch
+    torch.set_num_threads(num_threads)   # 작업 프로세스끼리 CPU 코어를 나눠 사용
+    env_manager = EnvManager(args)
+    env_manager.model_config['onnx_threads'] = num_threads
+    pipe = PipelineController(env_manager=env_manager, preprocessor=PreProcessor(), db_manager=DBManager(env_manager.db_config),
+                              model_manager=ModelManager(env_manager.model_config), llm_manager=LLMManager(env_manager.model_config))
+    pipe.set_env()
+    start, n_rows, n_classified = time.time(), 0, 0
+    try:
+        for input_data in pipe.postgres.iter_range_data(env_manager.conv_tb_name, start_date, end_date,
+                                                        columns=TableEditor.CONV_COLUMNS[:5], itersize=itersize):
+            n_classified += len(pipe.process_data(input_data, relabel=relabel))
+            n_rows += len(input_data)
+            progress_queue.put((shard_id, n_rows, n_classified, time.time() - start, False))
+    finally:
+        pipe.release_connection()
+    progress_queue.put((shard_id, n_rows, n_classified, time.time() - start, True))
+    return shard_id, n_rows, n_classified, time.time() - start
+
+
+class ShardedReclassifier:
+    '''
+    대화 로그 전체 기간을 날짜 범위 shard로 나누어 여러 프로세스에서 동시에 분류합니다. (모델 업데이트 후 과거 데이터 재분류)
+    shard는 날짜별 질문 수가 비슷하도록 연속된 날짜 구간으로 나눕니다.
+    '''
+    def __init__(self, args, n_workers=None, relabel=False, itersize=5000):
+        self.args = args
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.relabel = relabel
+        self.itersize = itersize
+        self.env_manager = EnvManager(args)
+
+    @staticmethod
+    def plan_shards(date_counts, n_shards):
+        '''
+        날짜별 질문 수를 누적해 연속된 날짜 구간 n_shards개로 나눕니다.
+        args:
+        date_counts (list[tuple]): (20240130 형식 날짜, 질문 수) - 날짜 순
+
+        returns:
+        list[tuple]: (시작 날짜, 끝 날짜, 질문 수)
+        '''
+        total = sum(count for _, count in date_counts)
+        shards, shard_start, shard_count, cumulative = [], None, 0, 0
+        for pk_date, count in date_counts:
+            shard_start = shard_start or pk_date
+            shard_count += count
+            cumulative += count
+            if cumulative >= total * (len(shards) + 1) / n_shards:
+                shards.append((shard_start, pk_date, shard_count))
+                shard_start, shard_count = None, 0
+        if shard_start is not None:
+            shards.append((shard_start, date_counts[-1][0], shard_count))
+        return shards
+
+    def prepare_model(self):
+        '''
+        onnx backend인 경우 작업 프로세스들이 동시에 ONNX 파일을 내보내지 않도록 미리 한 번 내보냅니다.
+        '''
+        model_config = self.env_manager.model_config
+        if model_config.get('backend', 'torch') != 'onnx':
+            return
+        model_manager = ModelManager(model_config)
+        model_path = os.path.join(model_config['model_path'], 'kfdeberta', 'model-update')
+        quantize = model_config.get('onnx_quantize', False)
+        if model_manager._is_onnx_stale(model_path, os.path.join(model_path, 'model.int8.onnx' if quantize else 'model.onnx')):
+            model_manager.export_onnx(model_path, quantize=quantize)
+
+    def run(self, start_date=None, end_date=None):
+        '''
+        args:
+        start_date, end_date (str): 재분류 기간 (20240130 형식, 기본값: 전체 기간)
+
+        returns:
+        list[tuple]: shard별 (shard_id, 처리 행 수, 분류 질문 수, 소요 시간)
+        '''
+        logger = logging.getLogger(__name__)
+        postgres, _ = DBManager(self.env_manager.db_config).initialize_database()
+        try:
+            date_counts = postgres.get_question_counts_by_date(
+                self.env_manager.conv_tb_name, None if self.relabel else self.env_manager.cls_tb_name, start_date, end_date
+            )
+        finally:
+            postgres.db_connection.close()
+        if not date_counts:
+            logger.info("재분류할 질문이 없습니다.")
+            return []
+
+        shards = self.plan_shards(date_counts, self.n_workers)
+        num_threads = max(1, (os.cpu_count() or 1) // len(shards))
+        logger.info(f"🚀 재분류 시작: 질문 {sum(count for _, count in date_counts)}개, shard {len(shards)}개, 프로세스당 스레드 {num_threads}개")
+        for shard_id, (shard_start, shard_end, count) in enumerate(shards):
+            logger.info(f"   shard {shard_id}: {shard_start} ~ {shard_end} (질문 {count}개)")
+        self.prepare_model()
+
+        context = multiprocessing.get_context('spawn')   # 부모 프로세스의 DB 커넥션/torch 스레드를 물려받지 않도록 spawn 사용
+        with context.Manager() as manager, ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+            progress_queue = manager.Queue()
+            futures = [
+                executor.submit(_reclassify_shard, self.args, shard_id, shard_start, shard_end, self.relabel,
+                                num_threads, self.itersize, progress_queue)
+                for shard_id, (shard_start, shard_end, _) in enumerate(shards)
+            ]
+            finished = 0
+            while finished < len(futures):
+                try:
+                    shard_id, n_rows, n_classified, elapsed, done = progress_queue.get(timeout=10)
+                except queue.Empty:
+                    if any(future.done() and future.exception() for future in futures):
+                        break   # 실패한 shard는 아래 result()에서 예외 발생
+                    continue
+                finished += done
+                logger.info(f"   shard {shard_id}: {n_rows}행 처리, 분류 {n_classified}개, "
+                            f"{n_classified / max(elapsed, 1e-9):.1f} 질문/초{' ✅' if done else ''}")
+            results = [future.result() for future in futures]
+        logger.info(f"✅ 재분류 완료: 분류 {sum(result[2] for result in results)}개, 소요 시간 {max(result[3] for result in results):.1f}초")
+        return results
 
 
 class UnifiedPipeline:
@@ -334,7 +933,21 @@ class UnifiedPipeline:
             model_manager=self.model_manager,
             llm_manager=self.llm_manager
         )
-        self.pipe.set_env()
+        try:
+            self.pipe.set_env()
+            self.pipe.table_editor.create_conv_table(self.env_manager.conv_tb_name)   # hash_value UNIQUE 인덱스 확인 (upsert 중복 판단 기준)
+            self.watermark_manager = WatermarkManager(self.pipe.postgres, self.pipe.table_editor, self.env_manager.watermark_tb_name)
+        except Exception:
+            self.pipe.release_connection()   # 로드에 실패해도 커넥션은 풀에 반납
+            raise
+
+    def refresh(self):
+        '''
+        상주 실행 시 매 트리거마다 pipe.unit_of_work() 안에서 호출합니다. 
+        작업 단위 커넥션을 워터마크 관리자에 연결하고, 모델/종목 파일이 바뀐 경우에만 다시 로드합니다.
+        '''
+        self.watermark_manager.postgres, self.watermark_manager.table_editor = self.pipe.postgres, self.pipe.table_editor
+        return self.pipe.refresh_model()
     
     def collect_data(self):
         """데이터 수집 단계"""
@@ -351,9 +964,16 @@ class UnifiedPipeline:
             # ibk와 ibks 두 tenant_id 모두 수집
             all_api_data = []
             tenant_ids = ['ibk', 'ibks']
-            for tenant_id in tenant_ids:
-                logger.info(f"🔍 {tenant_id} tenant 데이터 수집 중...")
-                api_data = self.api_pipeline.get_data(date=start_date, tenant_id=tenant_id)
+            logger.info(f"🔍 {', '.join(tenant_ids)} tenant 데이터 동시 수집 중...")
+            if self.args.process == 'scheduled':    # 워터마크 이후 데이터만 수집
+                fetched = self.watermark_manager.fetch_many(self.api_pipeline, tenant_ids, start_date)
+            else:
+                fetched = [(tenant_id, api_data) for _, tenant_id, api_data in self.api_pipeline.get_data_many([start_date], tenant_ids)]
+            failed = [tenant_id for tenant_id, api_data in fetched if api_data is None]
+            if failed:
+                logger.error(f"❌ API 요청 실패: {', '.join(failed)}")
+                return None
+            for tenant_id, api_data in fetched:
                 if api_data:
                     all_api_data.extend(api_data)
                     logger.info(f"   ✅ {tenant_id}: {len(api_data)}개 레코드 수집")
@@ -361,17 +981,9 @@ class UnifiedPipeline:
                     logger.info(f"   ⚠️ {tenant_id}: 데이터 없음")
             
             logger.info(f"📊 총 수집된 API 데이터: {len(all_api_data)}개")
-            if not all_api_data:
-                logger.warning("❌ 수집된 데이터가 없습니다.")
-                return None
-            
+            # 신규 데이터가 없으면 빈 DataFrame 반환 (None은 요청 실패에만 사용)
             input_data = self.api_pipeline.process_data(all_api_data)
             logger.info(f"처리된 데이터 shape: {input_data.shape}")
-            
-            if input_data.empty:
-                logger.warning("❌ 처리된 데이터가 비어있습니다.")
-                return None
-            
             return input_data
         
         elif self.args.process == 'code-test':
@@ -399,6 +1011,23 @@ class UnifiedPipeline:
             logger.error(f"❌ 지원하지 않는 프로세스 타입입니다: {self.args.process}")
             return None
     
+    def iter_collected_data(self, chunk_size=1000):
+        """데이터 수집 단계 (스트리밍) - API 응답을 chunk_size개 레코드 단위로 처리해 DataFrame을 반환"""
+        logger = logging.getLogger(__name__)
+        start_date = datetime.now().strftime("%Y-%m-%d")
+        tenant_ids = ['ibk', 'ibks']
+        logger.info(f"🚀 스트리밍 데이터 수집 시작: {start_date} (chunk: {chunk_size})")
+        if self.args.process == 'scheduled':
+            chunks = self.watermark_manager.iter_chunks(self.api_pipeline, tenant_ids, start_date, chunk_size=chunk_size)
+        else:
+            chunks = ((tenant_id, chunk) for tenant_id in tenant_ids
+                      for chunk in self.api_pipeline.iter_data(start_date, tenant_id=tenant_id, chunk_size=chunk_size))
+        for tenant_id, api_data in chunks:
+            logger.info(f"   ✅ {tenant_id}: {len(api_data)}개 레코드 수신")
+            input_data = self.api_pipeline.process_data(api_data)
+            if not input_data.empty:
+                yield input_data
+
     def process_and_store_data(self, input_data):
         """데이터 처리 및 저장 단계"""
         logger = logging.getLogger(__name__)
@@ -409,6 +1038,8 @@ class UnifiedPipeline:
         logger.info("💾 데이터 처리 및 저장을 시작합니다.")
         
         # API 데이터인 경우 추가 컬럼 처리
+        total_records = len(input_data)
+        existing_records = 0
         if self.args.process in ['daily', 'scheduled']:
             required_columns = ['date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']
             missing_columns = [col for col in required_columns if col not in input_data.columns]
@@ -418,42 +1049,12 @@ class UnifiedPipeline:
             
             input_data = input_data[required_columns]
             
-            # 날짜별 카운터 초기화
-            date_counters = {}
-            for date_str in input_data['date'].unique():
-                date_value = datetime.fromisoformat(date_str)
-                kst = timezone(timedelta(hours=9))
-                if date_value.tzinfo is None:
-                    date_value = date_value.replace(tzinfo=timezone.utc)
-                kst_date = date_value.astimezone(kst)
-                pk_date = f"{str(kst_date.year)}{str(kst_date.month).zfill(2)}{str(kst_date.day).zfill(2)}"
-                
-                try:
-                    self.pipe.postgres.db_connection.cur.execute(
-                        f"SELECT MAX(conv_id) FROM {self.env_manager.conv_tb_name} WHERE conv_id LIKE %s",
-                        (f"{pk_date}_%",)
-                    )
-                    max_conv_id = self.pipe.postgres.db_connection.cur.fetchone()[0]
-                    date_counters[pk_date] = int(max_conv_id.split('_')[1]) if max_conv_id else 0
-                except:
-                    date_counters[pk_date] = 0
+            # 중복 데이터를 먼저 제외해 신규 데이터에만 conv_id 번호를 예약
+            input_data, existing_records = self.pipe.drop_duplicate_hashes(input_data)
             
-            # conv_id 생성 및 KST 변환
-            conv_ids = []
-            for idx in tqdm(range(len(input_data))):
-                date_value = datetime.fromisoformat(input_data['date'][idx])
-                kst = timezone(timedelta(hours=9))
-                if date_value.tzinfo is None:
-                    date_value = date_value.replace(tzinfo=timezone.utc)
-                kst_date = date_value.astimezone(kst)
-                
-                input_data.at[idx, 'date'] = kst_date.isoformat()
-                pk_date = f"{str(kst_date.year)}{str(kst_date.month).zfill(2)}{str(kst_date.day).zfill(2)}"
-                date_counters[pk_date] += 1
-                conv_ids.append(f"{pk_date}_{str(date_counters[pk_date]).zfill(5)}")
-            
-            input_data.insert(0, 'conv_id', conv_ids)
-            input_data = input_data[['conv_id', 'date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']]
+            # KST 변환 및 conv_id 생성
+            if not input_data.empty:
+                input_data = self.pipe.assign_conv_ids(input_data)
             
         else:
             # 기존 파일 데이터 처리
@@ -476,31 +1077,25 @@ class UnifiedPipeline:
                 logger.info(f"📊 A에 hash_ref 있음: {a_with_ref}개")
         
         # 데이터베이스에 저장
-        total_records = len(input_data)
-        existing_records = 0
-        new_records = 0
-        
+        new_rows = []
         for idx in tqdm(range(len(input_data))):
-            # 중복 체크 (API 데이터인 경우 해시값으로, 파일 데이터인 경우 PK로)
-            if self.args.process in ['daily', 'scheduled'] and 'hash_value' in input_data.columns:
-                if self.pipe.postgres.check_hash_duplicate(self.env_manager.conv_tb_name, input_data['hash_value'][idx]):
-                    existing_records += 1
-                    logger.info(f"이미 존재하는 데이터 (해시: {input_data['hash_value'][idx][:8]}...): {input_data['conv_id'][idx]}")
-                    continue
-            else:
-                if self.pipe.postgres.check_pk(self.env_manager.conv_tb_name, input_data['conv_id'][idx]):
-                    existing_records += 1
-                    logger.info(f"이미 존재하는 데이터: {input_data['conv_id'][idx]}")
-                    continue
-            
-            new_records += 1
             data_set = list(input_data.iloc[idx].values)
             # user_id가 None이거나 빈 문자열인 경우 'UNKNOWN'으로 변경
             if len(data_set) >= 5:  # user_id는 인덱스 4 (conv_id, date, q/a, content, user_id, ...)
                 if data_set[4] is None or data_set[4] == "":
                     data_set[4] = "UNKNOWN"
-            data_set = tuple(data_set)
-            self.pipe.table_editor.edit_conv_table('insert', self.env_manager.conv_tb_name, data_type='raw', data=data_set)
+            new_rows.append(tuple(data_set))
+        
+        # 한 번의 트랜잭션으로 일괄 저장 - 이미 존재하는 행은 DB가 건너뛰고 개수를 알려줌
+        if self.args.process in ['daily', 'scheduled']:   # API 데이터: 같은 hash_value만 건너뜀 (conv_id 충돌은 오류)
+            new_records, skipped_records = self.pipe.table_editor.edit_conv_table(
+                'insert', self.env_manager.conv_tb_name, data_type='upsert', data=new_rows
+            )
+        else:   # 파일 데이터: hash_value가 없으므로 이미 저장된 conv_id를 건너뜀
+            new_records, skipped_records = self.pipe.table_editor.upsert(
+                self.env_manager.conv_tb_name, self.pipe.table_editor.CONV_COLUMNS, new_rows, conflict_columns=['conv_id']
+            )
+        existing_records += skipped_records
         
         # 저장 결과 요약
         summary_msg = f"📊 데이터 저장 완료 - 전체: {total_records}, 신규: {new_records}, 중복: {existing_records}"
@@ -529,16 +1124,33 @@ class UnifiedPipeline:
         logger.info("=== 통합 파이프라인 시작 ===")
         
         try:
-            # 1단계: 데이터 수집
-            input_data = self.collect_data()
-            if input_data is None:
-                logger.warning("⚠️ 데이터 수집 실패로 파이프라인을 종료합니다.")
-                return False
-            
-            # 2단계: 데이터 처리 및 저장
-            if not self.process_and_store_data(input_data):
-                logger.warning("⚠️ 데이터 저장 실패로 파이프라인을 종료합니다.")
-                return False
+            if getattr(self.args, 'stream', False) and self.args.process in ['daily', 'scheduled']:
+                # 1, 2단계: chunk 단위로 수집, 처리, 저장 (메모리 사용량 일정)
+                try:
+                    stored = [self.process_and_store_data(input_data) for input_data in self.iter_collected_data(getattr(self.args, 'chunk_size', 1000))]
+                except (requests.RequestException, ValueError) as e:    # 요청 실패 또는 수신 중단 - 워터마크를 옮기지 않음
+                    logger.warning(f"⚠️ 데이터 수집 실패로 파이프라인을 종료합니다: {str(e)}")
+                    return False
+                if not all(stored):
+                    logger.warning("⚠️ 데이터 수집 및 저장 실패로 파이프라인을 종료합니다.")
+                    return False
+                if not stored:    # 워터마크 이후 신규 데이터가 없는 경우 (정상)
+                    logger.info("ℹ️ 신규 데이터가 없어 저장을 건너뜁니다.")
+            else:
+                # 1단계: 데이터 수집
+                input_data = self.collect_data()
+                if input_data is None:
+                    logger.warning("⚠️ 데이터 수집 실패로 파이프라인을 종료합니다.")
+                    return False
+                
+                # 2단계: 데이터 처리 및 저장 (신규 데이터가 없으면 건너뛰고 분석 진행)
+                if input_data.empty:
+                    logger.info("ℹ️ 신규 데이터가 없어 저장을 건너뜁니다.")
+                elif not self.process_and_store_data(input_data):
+                    logger.warning("⚠️ 데이터 저장 실패로 파이프라인을 종료합니다.")
+                    return False
+            if self.args.process == 'scheduled':
+                self.watermark_manager.commit()
             
             # 3단계: 데이터 분석 (main.py의 기능)
             if not self.run_analysis():
@@ -552,6 +1164,6 @@ class UnifiedPipeline:
             logger.error(f"❌ 통합 파이프라인 실행 중 오류 발생: {str(e)}")
             return False
         finally:
-            # 데이터베이스 연결 종료
-            if hasattr(self.pipe, 'postgres') and hasattr(self.pipe.postgres, 'db_connection'):
-                self.pipe.postgres.db_connection.close()
+            # 실패한 실행의 워터마크는 반영하지 않고, 데이터베이스 연결 반납
+            self.watermark_manager.discard()
+            self.pipe.release_connection()
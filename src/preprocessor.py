@@ -1,15 +1,30 @@
-from sklearn.model_selection import train_test_split
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from datasets import Dataset, DatasetDict
 import pandas as pd
+import hashlib
+import pickle
+import os
 import re
 
+
+def generate_hash_value(user_id, content, date):
+    '''
+    대화 로그 중복 체크에 사용하는 해시값을 생성합니다. md5("{user_id}_{content}_{date}")
+    '''
+    return hashlib.md5(f"{user_id}_{content}_{date}".encode()).hexdigest()
+
+
+def _hash_batch(rows):
+    return [generate_hash_value(*row) for row in rows]
+
+
 class DataProcessor:
     def data_to_df(self, dataset, columns):
         if isinstance(dataset, list):
             return pd.DataFrame(dataset, columns=columns)
        
     def df_to_hfdata(self, df):
+        from datasets import Dataset
         return Dataset.from_pandas(df)
 
     def merge_data(self, df1, df2, how='inner', on=None):
@@ -33,7 +48,23 @@ class DataProcessor:
             df.drop(keyword_idx, inplace=True)
             return df.reset_index(drop=True)
         
+    def hash_values(self, user_ids, contents, dates, n_workers=1, chunk_size=50000):
+        '''
+        user_id, content, date 컬럼으로 generate_hash_value와 동일한 해시값을 일괄 생성합니다. 
+        n_workers > 1이고 데이터가 chunk_size보다 많으면 프로세스 풀에서 chunk 단위로 병렬 처리합니다. (대량 백필용)
+
+        returns:
+        list[str]: 입력 순서대로 해시값 
+        '''
+        rows = list(zip(user_ids, contents, dates))
+        if n_workers <= 1 or len(rows) <= chunk_size:
+            return _hash_batch(rows)
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            return [hash_value for hashes in executor.map(_hash_batch, chunks) for hash_value in hashes]
+
     def train_test_split(self, dataset, x_col, y_col, test_size, val_test_size, random_state=42):
+        from sklearn.model_selection import train_test_split
         X, X_test, y, y_test = train_test_split(dataset[x_col], dataset[y_col], test_size=0.2, stratify=dataset[y_col], random_state=random_state)
         X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=val_test_size, stratify=y, random_state=random_state)
         return X, X_val, X_test, y, y_val, y_test  
@@ -83,7 +114,10 @@ class TextProcessor:
     def get_val_with_indices(self, val, text):
         '''
         val 값이 text에 있으면 시작과 끝 위치 정보와 함께 값을 반환합니다.
+        종목 목록 전체를 찾는 경우 list 대신 TickerMatcher를 전달하면 정규식을 매번 만들지 않습니다.
         '''
+        if isinstance(val, TickerMatcher):
+            return val.find_all(text)
         found_stocks = []
         if isinstance(val, str):
             pattern = rf'(^|[^a-zA-Z0-9가-힣]){re.escape(val)}($|[^a-zA-Z0-9가-힣])'
@@ -106,6 +140,167 @@ class TextProcessor:
         print(f'Euclidean Distance: {value}, Threshold: {threshold}')
         return "모르는 정보입니다." if value > threshold else txt
 
+class TickerMatcher:
+    '''
+    증권 종목(tickle) 목록으로 만든 Aho-Corasick 오토마톤
+    텍스트를 한 번만 훑어서 모든 종목 위치를 찾습니다. (종목마다 정규식을 만들거나 리스트를 선형 탐색하지 않음)
+    경계 규칙
+    - 영문/숫자로 시작하거나 끝나는 종목: 앞뒤 문자가 영문/숫자가 아니어야 함 (NVDA주가 -> NVDA)
+    - 한글로 시작하는 종목: 앞 문자가 한글/영문/숫자가 아니어야 함
+    - 한글로 끝나는 종목: 뒤에 한글이 이어지면 조사/접미어(KOREAN_SUFFIXES)로 시작하는 경우만 허용 (삼성전자의, 삼성전자주가)
+    '''
+    KOREAN_SUFFIXES = ('은', '는', '이', '가', '을', '를', '의', '에', '도', '만', '과', '와', '로', '으로', '랑', '이랑',
+                       '뉴스', '주식', '주가', '정보', '분석', '전망', '시세', '종목', '관련')
+
+    def __init__(self, words):
+        self.words = frozenset(word for word in words if word)
+        self.goto, self.fail, self.out = [{}], [0], [()]
+        for word in self.words:
+            node = 0
+            for char in word:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.out[node] = (len(word),)
+        queue = list(self.goto[0].values())
+        for node in queue:   # BFS로 실패 링크와 출력(접미 일치 종목 길이) 연결
+            for char, child in self.goto[node].items():
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+                queue.append(child)
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def __len__(self):
+        return len(self.words)
+
+    @staticmethod
+    def _is_hangul(char):
+        return '가' <= char <= '힣'
+
+    @staticmethod
+    def _is_alnum(char):
+        return char.isascii() and char.isalnum()
+
+    def _is_boundary(self, text, start, end):
+        if start > 0:
+            prev = text[start - 1]
+            if self._is_alnum(prev) or (self._is_hangul(text[start]) and self._is_hangul(prev)):
+                return False
+        if end < len(text):
+            nxt = text[end]
+            if self._is_alnum(nxt):
+                return False
+            if self._is_hangul(text[end - 1]) and self._is_hangul(nxt):
+                return text.startswith(self.KOREAN_SUFFIXES, end)
+        return True
+
+    def find_all(self, text, overlapping=False):
+        '''
+        텍스트에 포함된 종목을 (종목, 시작 위치, 끝 위치) 리스트로 반환합니다. (get_val_with_indices와 같은 형식)
+        overlapping=False면 겹치는 경우 먼저 시작하는 가장 긴 종목만 남깁니다.
+        '''
+        matches, node = [], 0
+        for idx, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for length in self.out[node]:
+                start = idx + 1 - length
+                if self._is_boundary(text, start, idx + 1):
+                    matches.append((text[start:idx + 1], start, idx + 1))
+        if overlapping:
+            return sorted(matches, key=lambda match: match[1])
+        selected, last_end = [], 0
+        for match in sorted(matches, key=lambda match: (match[1], -match[2])):
+            if match[1] >= last_end:
+                selected.append(match)
+                last_end = match[2]
+        return selected
+
+    @classmethod
+    def load(cls, csv_path, cache_path=None):
+        '''
+        tickle csv로 오토마톤을 만들고 pickle 파일로 저장합니다. csv의 크기/수정 시각이 같으면 저장된 오토마톤을 그대로 사용합니다.
+        args:
+        csv_path (str): tickle 컬럼이 있는 종목 csv 경로
+        cache_path (str): pickle 저장 경로 (기본값: csv와 같은 위치의 .pkl)
+        '''
+        cache_path = cache_path or os.path.splitext(csv_path)[0] + '.pkl'
+        stat = os.stat(csv_path)
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached['fingerprint'] == fingerprint:
+                return cached['matcher']
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            pass
+        tickles = pd.read_csv(csv_path)
+        tickles.dropna(inplace=True)
+        matcher = cls(tickles['tickle'].astype(str).values.tolist())
+        try:
+            with open(cache_path, 'wb') as f:
+                pickle.dump({'fingerprint': fingerprint, 'matcher': matcher}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:   # 읽기 전용 경로면 캐시 없이 사용
+            pass
+        return matcher
+
+class QueryFeatureExtractor:
+    '''
+    분류 루프에서 질문마다 계산하던 특징값을 배치 단위로 한 번에 계산합니다. 정규식은 한 번만 컴파일하고, 종목은 frozenset으로 조회합니다.
+    - clicked: 앱 내 버튼 클릭 표현값 (삼성전자(KR:005930)) 포함 여부
+    - single_token: val tokenizer 기준 단일 토큰 질문 여부 (tokenizer가 없으면 None)
+    - cleaned: 끝의 불필요한 단어(뉴스|주식|정보|분석)를 제거한 질문
+    - ticker_hit: cleaned가 종목 이름/코드와 일치하는지 여부
+    - tickers: 질문에 언급된 종목 목록 (TickerMatcher를 전달한 경우)
+    '''
+    CLICKED_PATTERN = re.compile(r"\b\w+\(KR:\d+\)")
+    SUFFIX_PATTERN = re.compile(r"(뉴스|주식|정보|분석)$")
+
+    def __init__(self, tickers, tokenizer=None):
+        '''
+        args:
+        tickers (TickerMatcher | iterable[str]): 종목 목록
+        tokenizer (KFDeBERTaTokenizer): 토큰 개수 검사에 사용할 val tokenizer
+        '''
+        self.matcher = tickers if isinstance(tickers, TickerMatcher) else None
+        self.tickers = tickers.words if self.matcher is not None else frozenset(tickers)
+        self.tokenizer = tokenizer
+
+    def extract(self, queries, count_tokens=True, find_tickers=True):
+        '''
+        args:
+        queries (iterable[str]): 질문 목록
+        count_tokens (bool): False면 토큰화를 생략합니다. (single_token = None)
+        find_tickers (bool): False면 종목 탐색을 생략합니다. (tickers = [])
+
+        returns:
+        list[dict]: 입력 순서대로 질문별 특징값
+        '''
+        queries = list(queries)
+        token_counts = self.tokenizer.count_tokens(queries) if count_tokens and self.tokenizer is not None else [None] * len(queries)
+        clicked_search, suffix_sub, tickers = self.CLICKED_PATTERN.search, self.SUFFIX_PATTERN.sub, self.tickers
+        matcher = self.matcher if find_tickers else None
+        features = []
+        for query, n_tokens in zip(queries, token_counts):
+            cleaned = suffix_sub('', query)
+            features.append({
+                'clicked': clicked_search(query) is not None,
+                'single_token': None if n_tokens is None else n_tokens == 1,
+                'cleaned': cleaned,
+                'ticker_hit': cleaned in tickers,
+                'tickers': [ticker for ticker, _, _ in matcher.find_all(query)] if matcher is not None else [],
+            })
+        return features
+
 class VecProcessor:
     '''
     임베딩 유사도 계산 및 임계
@@ -131,6 +326,13 @@ class TimeProcessor:
         now = datetime.now()
         return str(now.year), str(now.month).zfill(2), str(now.day).zfill(2)
 
+    def utc_to_kst(self, dates):
+        '''
+        UTC ISO 형식 date 문자열 Series를 KST(Asia/Seoul) datetime Series로 일괄 변환합니다. 
+        timezone 정보가 없는 값은 UTC로 간주합니다.
+        '''
+        return pd.to_datetime(dates, utc=True, format='ISO8601').dt.tz_convert('Asia/Seoul')
+
 
 
 class ETC:
@@ -0,0 +1,153 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+import threading
+import logging
+import json
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    '''
+    최근 window개 요청의 처리 시간(ms)으로 p50, p99를 계산합니다.
+    '''
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms):
+        with self.lock:
+            self.latencies.append(latency_ms)
+            self.count += 1
+
+    @staticmethod
+    def percentile(values, q):
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+    def summary(self):
+        with self.lock:
+            values = sorted(self.latencies)
+            count = self.count
+        return {
+            'count': count,
+            'p50_ms': self.percentile(values, 50),
+            'p99_ms': self.percentile(values, 99),
+            'max_ms': values[-1] if values else None,
+        }
+
+
+class ClassificationService:
+    '''
+    상주 ModelPredictor와 종목 매처로 질문을 실시간 분류합니다.
+    짧은 시간(max_wait_ms) 안에 들어온 여러 요청의 문장을 predictor.start_batching()의 BatchingExecutor로 모아
+    한 번의 predict_batch로 처리합니다. (micro-batching)
+    '''
+    def __init__(self, predictor, query_features, max_batch_size=32, max_wait_ms=5, window=10000):
+        self.predictor = predictor
+        self.query_features = query_features
+        self.latency = LatencyTracker(window)
+        self.executor = predictor.start_batching(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.features_lock = threading.Lock()   # 요청 스레드끼리 val tokenizer를 동시에 사용하지 않도록 보호
+
+    def classify(self, texts, timeout=None):
+        '''
+        PipelineController.classify_queries와 같은 규칙으로 분류합니다. (단일 토큰 질문은 종목 사전으로 판단)
+        args:
+        texts (list[str]): 분류할 질문 목록
+
+        returns:
+        list[dict]: 입력 순서대로 text, label(stock/nstock), enc_res(o/x), proba, clicked, tickers
+        '''
+        texts = [str(text) for text in texts]
+        predictions = self.executor.map(texts, timeout=timeout)
+        with self.features_lock:
+            features = self.query_features.extract(texts)
+        results = []
+        for text, (label, proba), feature in zip(texts, predictions, features):
+            enc_res = 'o' if label == 'stock' else 'x'
+            if feature['single_token']:
+                enc_res = 'o' if feature['ticker_hit'] else 'x'
+            results.append({
+                'text': text,
+                'label': label,
+                'enc_res': enc_res,
+                'proba': proba,
+                'clicked': feature['clicked'],
+                'tickers': feature['tickers'],
+            })
+        return results
+
+    def metrics(self):
+        summary = self.latency.summary()
+        summary.update(self.executor.stats())
+        return summary
+
+    def close(self):
+        self.predictor.stop_batching()
+
+
+class ClassificationRequestHandler(BaseHTTPRequestHandler):
+    '''
+    POST /classify  {"text": "..."} 또는 {"texts": ["...", ...]}
+    GET  /metrics   요청 처리 시간 p50/p99, 배치 통계
+    GET  /health
+    '''
+    service = None
+    timeout_sec = 30
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send_json(200, self.service.metrics())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/classify':
+            self._send_json(404, {'error': 'not found'})
+            return
+        start = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            single = 'text' in body
+            texts = [body['text']] if single else body.get('texts')
+            if not isinstance(texts, list):
+                raise ValueError("'text' 또는 'texts' 필드가 필요합니다.")
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        try:
+            results = self.service.classify(texts, timeout=self.timeout_sec)
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self.service.latency.record((time.perf_counter() - start) * 1000)
+        self._send_json(200, results[0] if single else {'results': results})
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ClassificationHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 128   # 동시 접속이 몰려도 연결이 거부되지 않도록 listen backlog 확장
+
+
+def create_server(service, host='127.0.0.1', port=8000):
+    '''
+    ClassificationService를 사용하는 HTTP 서버를 만듭니다. (요청마다 스레드 생성, 배치 처리는 service에서 수행)
+    '''
+    handler = type('BoundClassificationRequestHandler', (ClassificationRequestHandler,), {'service': service})
+    return ClassificationHTTPServer((host, port), handler)
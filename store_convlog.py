@@ -24,6 +24,7 @@ def main(args):
     db_manager = DBManager(env_manager.db_config)
     pipe = PipelineController(env_manager=env_manager, preprocessor=preprocessor, db_manager=db_manager)   
     pipe.set_env()
+    pipe.table_editor.create_conv_table(env_manager.conv_tb_name)   # hash_value UNIQUE 인덱스 확인 (upsert 중복 판단 기준)
 
     if args.process == 'code-test':   # 저장할 파일명 지정   
         if args.file_name.split('.')[-1] == 'csv': 
@@ -48,12 +49,9 @@ def main(args):
         conv_ids.append(conv_id)
     input_data.insert(0, 'conv_id', conv_ids)
     
-    for idx in tqdm(range(len(input_data))):   # PostgreSQL 테이블에 데이터 저장
-        if pipe.postgres.check_pk(pipe.env_manager.conv_tb_name, input_data['conv_id'][idx]):   # 데이터 존재 여부 확인
-            logger.info(f"해당 파일이 이미 존재합니다: {input_data['conv_id'][idx]}")
-            continue
-        data_set = tuple(input_data.iloc[idx].values)
-        pipe.table_editor.edit_conv_table('insert', pipe.env_manager.conv_tb_name, data_type='raw', data=data_set)            
+    # PostgreSQL 테이블에 일괄 저장 (파일 데이터는 hash_value가 없으므로 이미 저장된 conv_id를 ON CONFLICT로 건너뜀)
+    inserted, skipped = pipe.table_editor.upsert(pipe.env_manager.conv_tb_name, pipe.table_editor.CONV_COLUMNS, input_data, conflict_columns=['conv_id'])
+    logger.info(f"저장 완료 - 신규: {inserted}, 이미 존재: {skipped}")            
     pipe.postgres.db_connection.close()
 
 if __name__ == '__main__':
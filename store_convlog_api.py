@@ -1,4 +1,4 @@
-from src import EnvManager, PreProcessor, DBManager, APIPipeline, PipelineController
+from src import EnvManager, PreProcessor, DBManager, APIPipeline, PipelineController, WatermarkManager
 from tqdm import tqdm
 import pandas as pd
 from dotenv import load_dotenv
@@ -52,162 +52,131 @@ def main(args):
     pipe = PipelineController(env_manager=env_manager, preprocessor=preprocessor, db_manager=db_manager)   
     pipe.set_env()
 
-    if args.process == 'daily':    # 매일 12시 10분에 당일 데이터 저장
-        # 당일 날짜 기준으로 API 호출 (ibk, ibks 모두 수집)
-        today = datetime.now().strftime("%Y-%m-%d")
-        logger.info(f"📅 당일 데이터 수집: {today}")
+    try:
+        pipe.table_editor.create_conv_table(env_manager.conv_tb_name)   # hash_value UNIQUE 인덱스 확인 (upsert 중복 판단 기준)
+        watermark_manager = WatermarkManager(pipe.postgres, pipe.table_editor, env_manager.watermark_tb_name)
+        if args.process == 'daily':    # 매일 12시 10분에 당일 데이터 저장
+            # 당일 날짜 기준으로 API 호출 (ibk, ibks 모두 수집)
+            today = datetime.now().strftime("%Y-%m-%d")
+            logger.info(f"📅 당일 데이터 수집: {today}")
         
-        # ibk와 ibks 두 tenant_id 모두 수집
-        all_api_data = []
-        tenant_ids = ['ibk', 'ibks']
-        for tenant_id in tenant_ids:
-            logger.info(f"🔍 {tenant_id} tenant 데이터 수집 중...")
-            api_data = api_pipeline.get_data(date=today, tenant_id=tenant_id)
-            if api_data:
-                all_api_data.extend(api_data)
-                logger.info(f"   ✅ {tenant_id}: {len(api_data)}개 레코드 수집")
-            else:
-                logger.info(f"   ⚠️ {tenant_id}: 데이터 없음")
+            # ibk와 ibks 두 tenant_id 모두 수집
+            all_api_data = []
+            tenant_ids = ['ibk', 'ibks']
+            logger.info(f"🔍 {', '.join(tenant_ids)} tenant 데이터 동시 수집 중...")
+            for _, tenant_id, api_data in api_pipeline.get_data_many([today], tenant_ids):
+                if api_data:
+                    all_api_data.extend(api_data)
+                    logger.info(f"   ✅ {tenant_id}: {len(api_data)}개 레코드 수집")
+                else:
+                    logger.info(f"   ⚠️ {tenant_id}: 데이터 없음")
         
-        logger.info(f"📊 총 수집된 API 데이터: {len(all_api_data)}개")
-        if not all_api_data:
-            logger.warning("❌ 수집된 데이터가 없습니다.")
-            return
+            logger.info(f"📊 총 수집된 API 데이터: {len(all_api_data)}개")
+            if not all_api_data:
+                logger.warning("❌ 수집된 데이터가 없습니다.")
+                return
         
-        input_data = api_pipeline.process_data(all_api_data)
-        print(f"처리된 데이터 shape: {input_data.shape}")        
-        if input_data.empty:
-            logger.warning("❌ 처리된 데이터가 비어있습니다.")
-            return
-        else:
-            print(input_data.head())
-    elif args.process == 'scheduled':  # 스케줄링 모드 - 매시간 실행
-        # 현재 시간 기준으로 데이터 수집 (ibk, ibks 모두 수집)
-        current_time = datetime.now()
-        start_date = current_time.strftime("%Y-%m-%d")
-        logger.info(f"📅 스케줄링 모드 - 현재 시간 데이터 수집: {start_date}")
+            input_data = api_pipeline.process_data(all_api_data)
+            print(f"처리된 데이터 shape: {input_data.shape}")        
+            if input_data.empty:
+                logger.warning("❌ 처리된 데이터가 비어있습니다.")
+                return
+            else:
+                print(input_data.head())
+        elif args.process == 'scheduled':  # 스케줄링 모드 - 매시간 실행
+            # 현재 시간 기준으로 데이터 수집 (ibk, ibks 모두 수집)
+            current_time = datetime.now()
+            start_date = current_time.strftime("%Y-%m-%d")
+            logger.info(f"📅 스케줄링 모드 - 현재 시간 데이터 수집: {start_date}")
         
-        # ibk와 ibks 두 tenant_id 모두 수집
-        all_api_data = []
-        tenant_ids = ['ibk', 'ibks']        
-        for tenant_id in tenant_ids:
-            logger.info(f"🔍 {tenant_id} tenant 데이터 수집 중...")
-            api_data = api_pipeline.get_data(date=start_date, tenant_id=tenant_id)
-            if api_data:
-                all_api_data.extend(api_data)
-                logger.info(f"   ✅ {tenant_id}: {len(api_data)}개 레코드 수집")
+            # ibk와 ibks 두 tenant_id 모두 수집
+            all_api_data = []
+            tenant_ids = ['ibk', 'ibks']
+            logger.info(f"🔍 {', '.join(tenant_ids)} tenant 데이터 동시 수집 중...")
+            for tenant_id, api_data in watermark_manager.fetch_many(api_pipeline, tenant_ids, start_date):    # 워터마크 이후 데이터만 수집
+                if api_data:
+                    all_api_data.extend(api_data)
+                    logger.info(f"   ✅ {tenant_id}: {len(api_data)}개 레코드 수집")
+                else:
+                    logger.info(f"   ⚠️ {tenant_id}: 데이터 없음")
+            logger.info(f"📊 총 수집된 API 데이터: {len(all_api_data)}개")
+            if not all_api_data:
+                logger.warning("❌ 수집된 데이터가 없습니다.")
+                return
+        
+            input_data = api_pipeline.process_data(all_api_data)
+            print(f"처리된 데이터 shape: {input_data.shape}")        
+            if input_data.empty:
+                logger.warning("❌ 처리된 데이터가 비어있습니다. 데이터가 없을 수 있습니다.")
+                return
             else:
-                logger.info(f"   ⚠️ {tenant_id}: 데이터 없음")
-        logger.info(f"📊 총 수집된 API 데이터: {len(all_api_data)}개")
-        if not all_api_data:
-            logger.warning("❌ 수집된 데이터가 없습니다.")
+                print(input_data.head())
+        else:
+            logger.error(f"❌ 지원하지 않는 프로세스 타입입니다: {args.process}")
+            logger.error("지원 타입: code-test, daily, scheduled")
+            return
+
+        if input_data is None:
+            logger.error("❌ input_data가 초기화되지 않았습니다.")
             return
         
-        input_data = api_pipeline.process_data(all_api_data)
-        print(f"처리된 데이터 shape: {input_data.shape}")        
         if input_data.empty:
-            logger.warning("❌ 처리된 데이터가 비어있습니다. 데이터가 없을 수 있습니다.")
+            logger.warning("❌ input_data가 비어있습니다.")
             return
-        else:
-            print(input_data.head())
-    else:
-        logger.error(f"❌ 지원하지 않는 프로세스 타입입니다: {args.process}")
-        logger.error("지원 타입: code-test, daily, scheduled")
-        return
-
-    if input_data is None:
-        logger.error("❌ input_data가 초기화되지 않았습니다.")
-        return
-        
-    if input_data.empty:
-        logger.warning("❌ input_data가 비어있습니다.")
-        return
 
-    required_columns = ['date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']
-    missing_columns = [col for col in required_columns if col not in input_data.columns]
-    if missing_columns:
-        logger.error(f"❌ 필요한 컬럼이 없습니다: {missing_columns}")
-        logger.error(f"현재 컬럼: {list(input_data.columns)}")
-        return
+        required_columns = ['date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']
+        missing_columns = [col for col in required_columns if col not in input_data.columns]
+        if missing_columns:
+            logger.error(f"❌ 필요한 컬럼이 없습니다: {missing_columns}")
+            logger.error(f"현재 컬럼: {list(input_data.columns)}")
+            return
 
-    input_data = input_data[required_columns]
-    date_counters = {}
+        input_data = input_data[required_columns]
+        # 중복 데이터를 먼저 제외해 신규 데이터에만 conv_id 번호를 예약
+        total_records = len(input_data)
+        input_data, existing_records = pipe.drop_duplicate_hashes(input_data)
     
-    # 기존 DB에서 각 날짜별 최대 conv_id 조회
-    for date_str in input_data['date'].unique():
-        date_value = datetime.fromisoformat(date_str)
-        kst = timezone(timedelta(hours=9))
-        if date_value.tzinfo is None:
-            date_value = date_value.replace(tzinfo=timezone.utc)
-        kst_date = date_value.astimezone(kst)
-        pk_date = f"{str(kst_date.year)}{str(kst_date.month).zfill(2)}{str(kst_date.day).zfill(2)}"
-        
-        try:
-            pipe.postgres.db_connection.cur.execute(
-                f"SELECT MAX(conv_id) FROM {pipe.env_manager.conv_tb_name} WHERE conv_id LIKE %s",
-                (f"{pk_date}_%",)
-            )
-            max_conv_id = pipe.postgres.db_connection.cur.fetchone()[0]
-            date_counters[pk_date] = int(max_conv_id.split('_')[1]) if max_conv_id else 0
-        except:
-            date_counters[pk_date] = 0
+        # KST 변환 및 conv_id 생성
+        if not input_data.empty:
+            input_data = pipe.assign_conv_ids(input_data)
     
-    # conv_id 생성 및 KST 변환
-    conv_ids = []
-    for idx in tqdm(range(len(input_data))):
-        date_value = datetime.fromisoformat(input_data['date'][idx])
-        kst = timezone(timedelta(hours=9))
-        if date_value.tzinfo is None:
-            date_value = date_value.replace(tzinfo=timezone.utc)
-        kst_date = date_value.astimezone(kst)
-        
-        input_data.at[idx, 'date'] = kst_date.isoformat()
-        pk_date = f"{str(kst_date.year)}{str(kst_date.month).zfill(2)}{str(kst_date.day).zfill(2)}"
-        date_counters[pk_date] += 1
-        conv_ids.append(f"{pk_date}_{str(date_counters[pk_date]).zfill(5)}")
-    
-    input_data.insert(0, 'conv_id', conv_ids)    
-    input_data = input_data[['conv_id', 'date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']]
-    
-    q_count = sum(1 for qa in input_data['q/a'] if qa == 'Q')
-    a_count = sum(1 for qa in input_data['q/a'] if qa == 'A')
-    a_with_ref = sum(1 for ref in input_data['hash_ref'] if ref is not None)
-    print(f"📊 Q&A 연결 통계: Q {q_count}개, A {a_count}개, A에 hash_ref 있음 {a_with_ref}개")
+        q_count = sum(1 for qa in input_data['q/a'] if qa == 'Q')
+        a_count = sum(1 for qa in input_data['q/a'] if qa == 'A')
+        a_with_ref = sum(1 for ref in input_data['hash_ref'] if ref is not None)
+        print(f"📊 Q&A 연결 통계: Q {q_count}개, A {a_count}개, A에 hash_ref 있음 {a_with_ref}개")
     
-    total_records = len(input_data)
-    existing_records = 0
-    new_records = 0    
-    for idx in tqdm(range(len(input_data))):   # PostgreSQL 테이블에 데이터 저장
-        # 해시값 기준으로 중복 체크
-        if pipe.postgres.check_hash_duplicate(pipe.env_manager.conv_tb_name, input_data['hash_value'][idx]):
-            existing_records += 1
-            logger.info(f"이미 존재하는 데이터 (해시: {input_data['hash_value'][idx][:8]}...): {input_data['conv_id'][idx]}")
-            continue
+        new_rows = []
+        for idx in tqdm(range(len(input_data))):   # PostgreSQL 테이블에 데이터 저장 (해시값 중복은 이미 제외됨)
+            data_set = tuple(input_data.iloc[idx].values)
         
-        new_records += 1
-        data_set = tuple(input_data.iloc[idx].values)
-        
-        if idx < 3:
-            print(f"🔍 저장할 데이터 {idx}: {data_set}")
-            print(f"   - conv_id: {data_set[0]}")
-            print(f"   - date: {data_set[1]}")
-            print(f"   - q/a: {data_set[2]}")
-            print(f"   - content: {data_set[3][:50]}...")
-            print(f"   - user_id: {data_set[4]}")
-            print(f"   - tenant_id: {data_set[5]}")
-            print(f"   - hash_value: {data_set[6]}")
-            print(f"   - hash_ref: {data_set[7]}")        
-        pipe.table_editor.edit_conv_table('insert', pipe.env_manager.conv_tb_name, data_type='raw', data=data_set)
+            if idx < 3:
+                print(f"🔍 저장할 데이터 {idx}: {data_set}")
+                print(f"   - conv_id: {data_set[0]}")
+                print(f"   - date: {data_set[1]}")
+                print(f"   - q/a: {data_set[2]}")
+                print(f"   - content: {data_set[3][:50]}...")
+                print(f"   - user_id: {data_set[4]}")
+                print(f"   - tenant_id: {data_set[5]}")
+                print(f"   - hash_value: {data_set[6]}")
+                print(f"   - hash_ref: {data_set[7]}")        
+            new_rows.append(data_set)
+    
+        # 한 번의 트랜잭션으로 일괄 저장 - 그 사이 다른 작업이 저장한 행은 ON CONFLICT로 건너뜀
+        new_records, skipped_records = pipe.table_editor.edit_conv_table('insert', pipe.env_manager.conv_tb_name, data_type='upsert', data=new_rows)
+        existing_records += skipped_records
+        if args.process == 'scheduled':
+            watermark_manager.commit()
     
-    summary_msg = f"📊 데이터 저장 완료 - 전체: {total_records}, 신규: {new_records}, 중복: {existing_records}"
-    print(f"\n{summary_msg}")
-    print(f"   전체 레코드: {total_records}")
-    print(f"   새로 저장된 레코드: {new_records}")
-    print(f"   이미 존재하는 레코드: {existing_records}")
-    print(f"   중복률: {(existing_records/total_records*100):.1f}%" if total_records > 0 else "   중복률: 0%")    
-    logger.info(summary_msg)
-    logger.info(f"✅ 데이터 수집 작업이 완료되었습니다. ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})")
-    pipe.postgres.db_connection.close()
+        summary_msg = f"📊 데이터 저장 완료 - 전체: {total_records}, 신규: {new_records}, 중복: {existing_records}"
+        print(f"\n{summary_msg}")
+        print(f"   전체 레코드: {total_records}")
+        print(f"   새로 저장된 레코드: {new_records}")
+        print(f"   이미 존재하는 레코드: {existing_records}")
+        print(f"   중복률: {(existing_records/total_records*100):.1f}%" if total_records > 0 else "   중복률: 0%")    
+        logger.info(summary_msg)
+        logger.info(f"✅ 데이터 수집 작업이 완료되었습니다. ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})")
+    finally:
+        pipe.postgres.db_connection.close()   # 풀 커넥션 반납
 
 if __name__ == '__main__':
     cli_parser = argparse.ArgumentParser()
@@ -31,139 +31,101 @@ def main(args):
     pipe = PipelineController(env_manager=env_manager, preprocessor=preprocessor, db_manager=db_manager)   
     pipe.set_env()
 
-    if args.process == 'code-test':   # 저장할 파일명 지정   
-        if args.file_name.split('.')[-1] == 'csv': 
-            input_data = pd.read_csv(os.path.join(args.data_path, args.file_name))
-        elif args.file_name.split('.')[-1] == 'xlsx':
-            input_data = pd.read_excel(os.path.join(args.data_path, args.file_name))
-    elif args.process == 'daily':    # 날짜 범위 지정하여 데이터 저장
-        # API 호출용 날짜 설정 (KST 변환 없이 그대로 사용)
-        from_date = "2025-09-22"
-        to_date = "2025-09-23"
-        print(f"📅 API 요청 날짜: {from_date} ~ {to_date}")
-        
-        # 날짜 범위에 대해 API 호출 (ibk, ibks 모두 수집)
-        all_api_data = []
-        tenant_ids = ['ibk', 'ibks']
-        
-        current_date = datetime.strptime(from_date, "%Y-%m-%d")
-        end_date_obj = datetime.strptime(to_date, "%Y-%m-%d")
-        
-        while current_date <= end_date_obj:
-            date_str = current_date.strftime("%Y-%m-%d")
-            print(f"🔍 {date_str} 데이터 수집 중...")
-            
-            for tenant_id in tenant_ids:
-                print(f"   📋 {tenant_id} tenant 수집 중...")
-                api_data = api_pipeline.get_data(date=date_str, tenant_id=tenant_id)
+    try:
+        pipe.table_editor.create_conv_table(env_manager.conv_tb_name)   # hash_value UNIQUE 인덱스 확인 (upsert 중복 판단 기준)
+        if args.process == 'code-test':   # 저장할 파일명 지정   
+            if args.file_name.split('.')[-1] == 'csv': 
+                input_data = pd.read_csv(os.path.join(args.data_path, args.file_name))
+            elif args.file_name.split('.')[-1] == 'xlsx':
+                input_data = pd.read_excel(os.path.join(args.data_path, args.file_name))
+        elif args.process == 'daily':    # 날짜 범위 지정하여 데이터 저장
+            # API 호출용 날짜 설정 (KST 변환 없이 그대로 사용)
+            from_date = "2025-09-22"
+            to_date = "2025-09-23"
+            print(f"📅 API 요청 날짜: {from_date} ~ {to_date}")
+        
+            # 날짜 범위에 대해 API 호출 (ibk, ibks 모두 수집)
+            all_api_data = []
+            tenant_ids = ['ibk', 'ibks']
+        
+            current_date = datetime.strptime(from_date, "%Y-%m-%d")
+            end_date_obj = datetime.strptime(to_date, "%Y-%m-%d")
+        
+            date_strs = []
+            while current_date <= end_date_obj:
+                date_strs.append(current_date.strftime("%Y-%m-%d"))
+                current_date += timedelta(days=1)
+        
+            # 날짜 x tenant 요청을 동시에 수행하고, 결과는 날짜 -> tenant 순서로 병합
+            print(f"🔍 {date_strs[0]} ~ {date_strs[-1]} 데이터 동시 수집 중...")
+            for date_str, tenant_id, api_data in api_pipeline.get_data_many(date_strs, tenant_ids):
                 if api_data:
                     all_api_data.extend(api_data)
-                    print(f"      ✅ {tenant_id}: {len(api_data)}개 레코드 수집")
+                    print(f"   ✅ {date_str} {tenant_id}: {len(api_data)}개 레코드 수집")
                 else:
-                    print(f"      ⚠️ {tenant_id}: 데이터 없음")
-            
-            current_date += timedelta(days=1)
+                    print(f"   ⚠️ {date_str} {tenant_id}: 데이터 없음")
         
-        print(f"📊 총 수집된 API 데이터: {len(all_api_data)}개")
+            print(f"📊 총 수집된 API 데이터: {len(all_api_data)}개")
         
-        if not all_api_data:
-            print("❌ 수집된 데이터가 없습니다.")
-            return
+            if not all_api_data:
+                print("❌ 수집된 데이터가 없습니다.")
+                return
         
-        input_data = api_pipeline.process_data(all_api_data)
-        print(f"처리된 데이터 shape: {input_data.shape}")        
-        if input_data.empty:
-            print("❌ 처리된 데이터가 비어있습니다.")
-            return
-        else:
-            print(input_data.head())
+            input_data = api_pipeline.process_data(all_api_data, n_workers=os.cpu_count() or 1)    # 백필 데이터는 프로세스 풀로 해시 생성
+            print(f"처리된 데이터 shape: {input_data.shape}")        
+            if input_data.empty:
+                print("❌ 처리된 데이터가 비어있습니다.")
+                return
+            else:
+                print(input_data.head())
 
-    input_data = input_data[['date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']]
-    
-    # 날짜별 conv_id 카운터 초기화
-    date_counters = {}
-    
-    # 기존 DB에서 각 날짜별 최대 conv_id 조회
-    for date_str in input_data['date'].unique():
-        date_value = datetime.fromisoformat(date_str)
-        kst = timezone(timedelta(hours=9))
-        if date_value.tzinfo is None:
-            date_value = date_value.replace(tzinfo=timezone.utc)
-        kst_date = date_value.astimezone(kst)
-        pk_date = f"{str(kst_date.year)}{str(kst_date.month).zfill(2)}{str(kst_date.day).zfill(2)}"
-        
-        try:
-            pipe.postgres.db_connection.cur.execute(
-                f"SELECT MAX(conv_id) FROM {pipe.env_manager.conv_tb_name} WHERE conv_id LIKE %s",
-                (f"{pk_date}_%",)
-            )
-            max_conv_id = pipe.postgres.db_connection.cur.fetchone()[0]
-            date_counters[pk_date] = int(max_conv_id.split('_')[1]) if max_conv_id else 0
-        except:
-            date_counters[pk_date] = 0
-    
-    # conv_id 생성 및 KST 변환
-    conv_ids = []
-    for idx in tqdm(range(len(input_data))):
-        date_value = datetime.fromisoformat(input_data['date'][idx])
-        kst = timezone(timedelta(hours=9))
-        if date_value.tzinfo is None:
-            date_value = date_value.replace(tzinfo=timezone.utc)
-        kst_date = date_value.astimezone(kst)
-        
-        input_data.at[idx, 'date'] = kst_date.isoformat()
-        pk_date = f"{str(kst_date.year)}{str(kst_date.month).zfill(2)}{str(kst_date.day).zfill(2)}"
-        date_counters[pk_date] += 1
-        conv_ids.append(f"{pk_date}_{str(date_counters[pk_date]).zfill(5)}")
+        input_data = input_data[['date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']]
     
-    # conv_id를 첫 번째 컬럼으로 삽입
-    input_data.insert(0, 'conv_id', conv_ids)
+        # 중복 데이터를 먼저 제외해 신규 데이터에만 conv_id 번호를 예약
+        total_records = len(input_data)
+        input_data, existing_records = pipe.drop_duplicate_hashes(input_data)
     
-    # DB 테이블 구조에 맞는 컬럼 순서로 재정렬
-    input_data = input_data[['conv_id', 'date', 'q/a', 'content', 'user_id', 'tenant_id', 'hash_value', 'hash_ref']]
+        # KST 변환 및 conv_id 생성
+        if not input_data.empty:
+            input_data = pipe.assign_conv_ids(input_data)
     
-    # Q&A 연결 통계
-    q_count = sum(1 for qa in input_data['q/a'] if qa == 'Q')
-    a_count = sum(1 for qa in input_data['q/a'] if qa == 'A')
-    a_with_ref = sum(1 for ref in input_data['hash_ref'] if ref is not None)
-    print(f"📊 Q&A 연결 통계: Q {q_count}개, A {a_count}개, A에 hash_ref 있음 {a_with_ref}개")
+        # Q&A 연결 통계
+        q_count = sum(1 for qa in input_data['q/a'] if qa == 'Q')
+        a_count = sum(1 for qa in input_data['q/a'] if qa == 'A')
+        a_with_ref = sum(1 for ref in input_data['hash_ref'] if ref is not None)
+        print(f"📊 Q&A 연결 통계: Q {q_count}개, A {a_count}개, A에 hash_ref 있음 {a_with_ref}개")
     
-    # 중복 저장 방지 통계
-    total_records = len(input_data)
-    existing_records = 0
-    new_records = 0
+        # 중복 저장 방지 통계
+        new_rows = []
+        for idx in tqdm(range(len(input_data))):   # PostgreSQL 테이블에 데이터 저장 (해시값 중복은 이미 제외됨)
+            data_set = tuple(input_data.iloc[idx].values)
+        
+            # 디버깅: 저장할 데이터 확인 (처음 3개만)
+            if idx < 3:
+                print(f"🔍 저장할 데이터 {idx}: {data_set}")
+                print(f"   - conv_id: {data_set[0]}")
+                print(f"   - date: {data_set[1]}")
+                print(f"   - q/a: {data_set[2]}")
+                print(f"   - content: {data_set[3][:50]}...")
+                print(f"   - user_id: {data_set[4]}")
+                print(f"   - tenant_id: {data_set[5]}")
+                print(f"   - hash_value: {data_set[6]}")
+                print(f"   - hash_ref: {data_set[7]}")
+        
+            new_rows.append(data_set)
     
-    for idx in tqdm(range(len(input_data))):   # PostgreSQL 테이블에 데이터 저장
-        # 해시값 기준으로 중복 체크
-        if pipe.postgres.check_hash_duplicate(pipe.env_manager.conv_tb_name, input_data['hash_value'][idx]):
-            existing_records += 1
-            logger.info(f"이미 존재하는 데이터 (해시: {input_data['hash_value'][idx][:8]}...): {input_data['conv_id'][idx]}")
-            continue
-        
-        new_records += 1
-        data_set = tuple(input_data.iloc[idx].values)
-        
-        # 디버깅: 저장할 데이터 확인 (처음 3개만)
-        if idx < 3:
-            print(f"🔍 저장할 데이터 {idx}: {data_set}")
-            print(f"   - conv_id: {data_set[0]}")
-            print(f"   - date: {data_set[1]}")
-            print(f"   - q/a: {data_set[2]}")
-            print(f"   - content: {data_set[3][:50]}...")
-            print(f"   - user_id: {data_set[4]}")
-            print(f"   - tenant_id: {data_set[5]}")
-            print(f"   - hash_value: {data_set[6]}")
-            print(f"   - hash_ref: {data_set[7]}")
-        
-        pipe.table_editor.edit_conv_table('insert', pipe.env_manager.conv_tb_name, data_type='raw', data=data_set)
+        # 한 번의 트랜잭션으로 일괄 저장 - 그 사이 다른 작업이 저장한 행은 ON CONFLICT로 건너뜀
+        new_records, skipped_records = pipe.table_editor.edit_conv_table('insert', pipe.env_manager.conv_tb_name, data_type='upsert', data=new_rows)
+        existing_records += skipped_records
     
-    # 저장 결과 요약
-    print(f"\n📊 데이터 저장 결과:")
-    print(f"   전체 레코드: {total_records}")
-    print(f"   새로 저장된 레코드: {new_records}")
-    print(f"   이미 존재하는 레코드: {existing_records}")
-    print(f"   중복률: {(existing_records/total_records*100):.1f}%" if total_records > 0 else "   중복률: 0%")            
-    pipe.postgres.db_connection.close()
+        # 저장 결과 요약
+        print(f"\n📊 데이터 저장 결과:")
+        print(f"   전체 레코드: {total_records}")
+        print(f"   새로 저장된 레코드: {new_records}")
+        print(f"   이미 존재하는 레코드: {existing_records}")
+        print(f"   중복률: {(existing_records/total_records*100):.1f}%" if total_records > 0 else "   중복률: 0%")            
+    finally:
+        pipe.postgres.db_connection.close()   # 풀 커넥션 반납
 
 if __name__ == '__main__':
     cli_parser = argparse.ArgumentParser()
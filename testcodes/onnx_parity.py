@@ -0,0 +1,81 @@
+from src import EnvManager, PreProcessor, DBManager, ModelManager, PipelineController, KFDeBERTaTokenizer, KFDeBERTa, ModelPredictor, ONNXModel
+import pandas as pd
+import argparse
+import logging
+import tempfile
+import time
+import sys
+import os
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("onnx-parity.log"),
+        logging.StreamHandler()
+    ]
+)
+
+def timed_predict(predictor, texts, batch_size):
+    start = time.perf_counter()
+    predictor.predict_batch(texts, batch_size=batch_size)
+    return time.perf_counter() - start
+
+def main(args):
+    '''
+    model-update 모델을 임시 폴더에 ONNX로 새로 내보낸 뒤(KFDeBERTa.export_onnx), 학습 데이터세트의 test split에서 torch 모델과 예측 결과(레이블, 확률)와 추론 시간을 비교합니다.
+    '''
+    logger = logging.getLogger(__name__)
+    env_manager = EnvManager(args)
+    preprocessor = PreProcessor()
+    db_manager = DBManager(env_manager.db_config)
+    model_manager = ModelManager(env_manager.model_config)
+    model_path = os.path.join(env_manager.model_config['model_path'], 'kfdeberta', 'model-update')
+
+    pipe = PipelineController(env_manager=env_manager, preprocessor=preprocessor, db_manager=db_manager)
+    pipe.set_env()
+    convlog_data = pd.concat(
+        [chunk[chunk['qa'] == 'Q'] for chunk in pipe.postgres.iter_total_data(
+            env_manager.conv_tb_name, columns=['conv_id', 'qa', 'content'], as_dataframe=True)],
+        ignore_index=True
+    )
+    cls_data = pd.concat(
+        pipe.postgres.iter_total_data(env_manager.cls_tb_name, columns=['conv_id', 'ensemble'], as_dataframe=True),
+        ignore_index=True
+    )
+    pipe.postgres.db_connection.close()
+    texts = list(model_manager.set_cls_trainset(convlog_data, cls_data, pipe.data_p)['test']['text'])[:args.n_samples]
+
+    torch_predictor = model_manager.initialize_predictor(model_path, backend='torch')
+    with tempfile.TemporaryDirectory() as export_dir:
+        # 기존에 내보낸 파일이 아니라 이번에 내보낸 그래프로 비교 (model-update 폴더는 변경하지 않음)
+        tokenizer = KFDeBERTaTokenizer(model_path).tokenizer
+        kfdeberta = KFDeBERTa(model_path)
+        onnx_path = kfdeberta.export_onnx(os.path.join(export_dir, 'model.onnx'), tokenizer)
+        if args.quantize:
+            onnx_path = kfdeberta.quantize_onnx(onnx_path, os.path.join(export_dir, 'model.int8.onnx'))
+        logger.info(f"ONNX 모델 내보내기: {onnx_path} ({os.path.getsize(onnx_path) / 1024 ** 2:.1f}MB)")
+        onnx_predictor = ModelPredictor(tokenizer=tokenizer, model=ONNXModel(onnx_path, num_threads=env_manager.model_config.get('onnx_threads')))
+
+        result = torch_predictor.compare(onnx_predictor, texts, batch_size=args.batch_size)
+        torch_sec = timed_predict(torch_predictor, texts, args.batch_size)
+        onnx_sec = timed_predict(onnx_predictor, texts, args.batch_size)
+    logger.info(f"문장 수: {result['n']}, 레이블 일치율: {result['label_agreement']:.4f}, 확률 최대 오차: {result['max_abs_diff']:.6f}")
+    logger.info(f"추론 시간 - torch: {torch_sec:.2f}s, onnx: {onnx_sec:.2f}s ({torch_sec / max(onnx_sec, 1e-9):.2f}x)")
+
+    if result['label_agreement'] < args.min_agreement:
+        logger.error(f"❌ 레이블 일치율이 기준({args.min_agreement})보다 낮습니다. onnx backend를 사용하지 마세요.")
+        sys.exit(1)
+    logger.info("✅ parity 검사 통과")
+
+if __name__ == '__main__':
+    cli_parser = argparse.ArgumentParser()
+    cli_parser.add_argument('--config_path', type=str, default='config/')
+    cli_parser.add_argument('--task_name', type=str, default='cls')
+    cli_parser.add_argument('--query', type=str, default=None)
+    cli_parser.add_argument('--quantize', action='store_true', help='INT8 동적 양자화 모델 비교')
+    cli_parser.add_argument('--n_samples', type=int, default=2000)
+    cli_parser.add_argument('--batch_size', type=int, default=32)
+    cli_parser.add_argument('--min_agreement', type=float, default=0.995)
+    cli_args = cli_parser.parse_args()
+    main(cli_args)
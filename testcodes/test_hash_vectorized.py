@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+컬럼 단위 해시 생성(APIPipeline.process_data)이 기존 레코드 단위 해시 생성 방식과 동일한 결과를 내는지 검사하는 테스트 스크립트
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import pandas as pd
+from src.pipe import APIPipeline
+from src.preprocessor import DataProcessor
+
+COLUMNS = ["date", "q/a", "content", "user_id", "tenant_id", "hash_value", "hash_ref"]
+
+def legacy_process_data(data):
+    """기존 레코드 단위 처리 방식 (비교 기준)"""
+    records = []
+    for d in data:
+        if "Q" in d and "A" in d and "date" in d and "user_id" in d:
+            user_id = d["user_id"] if d["user_id"] is not None and d["user_id"] != "" else "UNKNOWN"
+            tenant_id = d.get("tenant_id") if d.get("tenant_id") is not None else None
+            q_hash = hashlib.md5(f"{user_id}_{d['Q']}_{d['date']}".encode()).hexdigest()
+            a_hash = hashlib.md5(f"{user_id}_{d['A']}_{d['date']}".encode()).hexdigest()
+            records.append({"date": d["date"], "q/a": "Q", "content": d["Q"], "user_id": user_id,
+                            "tenant_id": tenant_id, "hash_value": q_hash, "hash_ref": None})
+            records.append({"date": d["date"], "q/a": "A", "content": d["A"], "user_id": user_id,
+                            "tenant_id": tenant_id, "hash_value": a_hash, "hash_ref": q_hash})
+    return pd.DataFrame(records, columns=COLUMNS)
+
+def make_test_data(n=2000):
+    """user_id 누락/빈 문자열/숫자, tenant_id 누락, A 누락 레코드를 섞은 테스트 데이터"""
+    user_ids = [None, "", 12345, "user123", "사용자"]
+    tenant_ids = ["ibk", "ibks", None]
+    data = []
+    for i in range(n):
+        d = {"Q": f"삼성전자 주가 알려줘 {i}", "A": f"삼성전자 주가는 {i}원입니다.",
+             "date": f"2025-09-22T{i % 24:02d}:{i % 60:02d}:00.{i:06d}", "user_id": user_ids[i % len(user_ids)]}
+        if i % 4:
+            d["tenant_id"] = tenant_ids[i % len(tenant_ids)]
+        if i % 101 == 0:
+            del d["A"]
+        data.append(d)
+    return data
+
+def test_process_data_identical():
+    """process_data 결과가 기존 방식과 값, 순서 모두 동일한지 확인"""
+    data = make_test_data()
+    expected = legacy_process_data(data)
+    api_pipeline = APIPipeline(bearer_tok=None)
+    for n_workers in [1, 4]:
+        result = api_pipeline.process_data(data, n_workers=n_workers)
+        assert list(result.columns) == COLUMNS
+        for col in COLUMNS:
+            assert list(result[col]) == list(expected[col]), f"{col} 컬럼 불일치 (n_workers={n_workers})"
+    print("✅ 컬럼 단위 해시 생성 결과가 기존 방식과 동일합니다.")
+
+def test_hash_values_parallel():
+    """프로세스 풀 사용 여부와 관계없이 해시값이 동일한지 확인"""
+    n = 120000
+    user_ids, contents, dates = ["user123"] * n, [f"질문 {i}" for i in range(n)], ["2025-09-22T10:00:00"] * n
+    data_processor = DataProcessor()
+    serial = data_processor.hash_values(user_ids, contents, dates)
+    parallel = data_processor.hash_values(user_ids, contents, dates, n_workers=4)
+    assert serial == parallel
+    assert serial[0] == hashlib.md5("user123_질문 0_2025-09-22T10:00:00".encode()).hexdigest()
+    print("✅ 병렬 해시 생성 결과가 순차 생성 결과와 동일합니다.")
+
+if __name__ == "__main__":
+    test_process_data_identical()
+    test_hash_values_parallel()
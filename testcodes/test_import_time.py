@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+데이터 수집 스크립트(store_convlog_api.py)가 사용하는 모듈만 불러올 때 무거운 ML 패키지가 로드되지 않는지,
+import 시간이 기준 이내인지 검사하는 벤치마크 스크립트
+
+사용법: python testcodes/test_import_time.py [--runs 5] [--max_seconds 1.5]
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['torch', 'transformers', 'datasets', 'evaluate', 'openai', 'sklearn', 'onnxruntime']
+INGESTION_IMPORT = "from src import EnvManager, PreProcessor, DBManager, APIPipeline, PipelineController, WatermarkManager"
+
+def run_import(code, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result
+
+def slowest_imports(stderr, top=10):
+    """-X importtime 출력에서 누적 import 시간이 긴 모듈을 반환"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def test_no_heavy_modules():
+    """수집용 import에서 무거운 ML 패키지가 로드되지 않는지 확인"""
+    code = f"{INGESTION_IMPORT}; import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    _, result = run_import(code)
+    loaded = [module for module in result.stdout.strip().split(',') if module]
+    assert not loaded, f"수집용 import에서 무거운 패키지가 로드됨: {loaded}"
+    print("✅ 수집용 import에서 무거운 ML 패키지가 로드되지 않습니다.")
+
+def test_import_time(runs=5, max_seconds=1.5):
+    """수집용 import 시간(인터프리터 시작 포함)의 중앙값이 max_seconds 이내인지 확인"""
+    elapsed = [run_import(INGESTION_IMPORT)[0] for _ in range(runs)]
+    median = statistics.median(elapsed)
+    _, result = run_import(INGESTION_IMPORT, importtime=True)
+    print(f"📊 수집용 import 시간: 중앙값 {median:.3f}s (최소 {min(elapsed):.3f}s, 최대 {max(elapsed):.3f}s, {runs}회)")
+    for cumulative, module in slowest_imports(result.stderr):
+        print(f"   {cumulative / 1e6:.3f}s  {module}")
+    assert median <= max_seconds, f"수집용 import 시간이 기준({max_seconds}s)을 초과했습니다: {median:.3f}s"
+    print(f"✅ 수집용 import 시간이 기준({max_seconds}s) 이내입니다.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max_seconds', type=float, default=1.5)
+    args = parser.parse_args()
+    test_no_heavy_modules()
+    test_import_time(args.runs, args.max_seconds)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLMOpenAI.get_responses를 로컬 mock 서버(/v1/chat/completions)로 검사하는 스크립트
+- 동시 요청 수가 max_concurrency를 넘지 않는지
+- 429 / 503 응답을 다시 시도해 모든 질문에 응답하는지
+- 응답 순서와 토큰 사용량 집계가 맞는지
+
+사용법: python testcodes/test_llm_async.py [--n_queries 40] [--max_concurrency 4]
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import threading
+import json
+import time
+
+class MockState:
+    lock = threading.Lock()
+    in_flight, max_in_flight, attempts = 0, 0, {}
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    """질문별 첫 요청은 일부 429/503으로 응답하고, 이후 요청은 answer-{번호}로 응답하는 mock 서버"""
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        query = body['messages'][-1]['content']
+        with MockState.lock:
+            MockState.in_flight += 1
+            MockState.max_in_flight = max(MockState.max_in_flight, MockState.in_flight)
+            attempt = MockState.attempts[query] = MockState.attempts.get(query, 0) + 1
+        time.sleep(0.05)
+        with MockState.lock:
+            MockState.in_flight -= 1
+        index = int(query.split('-')[-1])
+        if attempt == 1 and index % 5 in (1, 2):
+            status = 429 if index % 5 == 1 else 503
+            self._send(status, {'error': {'message': 'mock error', 'type': 'mock', 'code': None}}, {'retry-after': '0'})
+            return
+        self._send(200, {
+            'id': f'chatcmpl-{index}', 'object': 'chat.completion', 'created': int(time.time()), 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': f'answer-{index}'}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 2, 'total_tokens': 12},
+        })
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class MockServer(ThreadingHTTPServer):
+    request_queue_size = 128
+
+def test_get_responses(n_queries=40, max_concurrency=4):
+    from src.llm import LLMOpenAI
+    server = MockServer(('127.0.0.1', 0), MockChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.setdefault('OPENAI_API_KEY', 'mock-key')
+    try:
+        llm = LLMOpenAI({
+            'max_tokens': 10, 'temperature': 0, 'openai_base_url': f'http://127.0.0.1:{server.server_port}/v1',
+            'max_concurrency': max_concurrency, 'rpm_limit': 6000, 'tpm_limit': 600000, 'backoff_base': 0.01, 'max_retries': 3,
+        })
+        llm.set_generation_config()
+        queries = [f'query-{i}' for i in range(n_queries)]
+        start = time.perf_counter()
+        responses = llm.get_responses(queries)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    summary = llm.usage_summary()
+    print(f"📊 {n_queries}개 질문 {elapsed:.2f}s, 최대 동시 요청 {MockState.max_in_flight}, 통계: {summary}")
+    assert responses == [f'answer-{i}' for i in range(n_queries)], responses
+    assert MockState.max_in_flight <= max_concurrency, MockState.max_in_flight
+    assert summary['errors'] == 0 and summary['retries'] == sum(i % 5 in (1, 2) for i in range(n_queries))
+    assert summary['prompt_tokens'] == 10 * n_queries and summary['completion_tokens'] == 2 * n_queries
+    print("✅ get_responses mock 서버 검사 통과")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_queries', type=int, default=40)
+    parser.add_argument('--max_concurrency', type=int, default=4)
+    args = parser.parse_args()
+    test_get_responses(args.n_queries, args.max_concurrency)
@@ -36,8 +36,16 @@ def main(args):
     c_yy, c_mm, c_dd = pipe.time_p.get_current_date()
     current_date = c_yy + c_mm + c_dd 
     
-    convlog_data = pipe.postgres.get_total_data(pipe.env_manager.conv_tb_name)
-    cls_data = pipe.postgres.get_total_data(pipe.env_manager.cls_tb_name)
+    # 서버 측 커서로 필요한 컬럼만 chunk 단위로 읽고, 사용자 질문(Q)만 남깁니다.
+    convlog_data = pd.concat(
+        [chunk[chunk['qa'] == 'Q'] for chunk in pipe.postgres.iter_total_data(
+            pipe.env_manager.conv_tb_name, columns=['conv_id', 'qa', 'content'], itersize=args.itersize, as_dataframe=True)],
+        ignore_index=True
+    )
+    cls_data = pd.concat(
+        pipe.postgres.iter_total_data(pipe.env_manager.cls_tb_name, columns=['conv_id', 'ensemble'], itersize=args.itersize, as_dataframe=True),
+        ignore_index=True
+    )
     stock_dict = model_manager.set_cls_trainset(convlog_data, cls_data, pipe.data_p)
     tokenized_stock = stock_dict.map(tok_class.tokenize_data, batched=True)
     trainer = model_manager.initialize_trainer(os.path.join(env_manager.model_config['model_path'], 'kfdeberta', 'model-update'), \
@@ -53,6 +61,7 @@ if __name__ == '__main__':
     cli_parser.add_argument('--config_path', type=str, default='config/')
     cli_parser.add_argument('--task_name', type=str, default='cls')
     cli_parser.add_argument('--query', type=str, default=None)
+    cli_parser.add_argument('--itersize', type=int, default=10000)
     cli_args = cli_parser.parse_args()
     '''schedule.every().monday.at("00:30").do(main, cli_args)
     while True:
@@ -1,4 +1,5 @@
 from src import EnvManager, PreProcessor, DBManager, ModelManager, LLMManager, PipelineController
+import pandas as pd
 import argparse 
 import logging
 import schedule
@@ -27,11 +28,14 @@ def main(args):
     
     pipe = PipelineController(env_manager=env_manager, preprocessor=preprocessor, db_manager=db_manager)   
     pipe.set_env()
-    tickles = pipe.env_manager.tickle_list
+    tickles = sorted(pipe.env_manager.tickle_matcher.words)
     print(tickles[:3])
-    data = pipe.postgres.get_total_data(pipe.env_manager.conv_tb_name)
-    data_df = pipe.data_p.data_to_df(data, ['conv_id', 'date', 'qa', 'content', 'user_id'])
-    print(data_df[data_df['qa'] == 'Q'].head())
+    data_df = pd.concat(
+        [chunk[chunk['qa'] == 'Q'] for chunk in pipe.postgres.iter_total_data(
+            pipe.env_manager.conv_tb_name, columns=['conv_id', 'date', 'qa', 'content', 'user_id'], as_dataframe=True)],
+        ignore_index=True
+    )
+    print(data_df.head())
 
 if __name__ == '__main__':
     cli_parser = argparse.ArgumentParser()